@@ -0,0 +1,261 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+from gobang_game import GobangGame
+from gobang_policy import board_to_tensor, legal_move_mask, select_action
+from game_records import open_training_log
+from mcts import MCTS
+from model_cache import build_agent, model_path
+from threat_eval import ThreatEvaluator
+from transposition import TranspositionTable
+
+# Player specs, e.g. 'random', 'replay', 'policy:models/15x15/model.pth', 'search:400', 'search:0.5s:path'
+PLAYER_KINDS = ('random', 'replay', 'policy', 'search')
+
+
+class RandomPlayer:
+    """Random moves among the candidate cells near the stones, like "Easy AI".
+
+    One ThreatEvaluator follows each game, catching up on the moves played
+    since the player last moved.
+    """
+
+    evaluations = 0
+
+    def __init__(self, board_size, rng=None):
+        self.rng = rng or random.Random()
+        self.threats = ThreatEvaluator(board_size)
+        self.placed = 0  # Moves of the current game already on self.threats
+
+    def reset(self, game_index):
+        self.threats.reset()
+        self.placed = 0
+
+    def move(self, game):
+        for i in range(self.placed, len(game.moves)):
+            self.threats.place(*game.moves[i], 1 if i % 2 == 0 else 2)  # Black moves first
+        self.placed = len(game.moves)
+        xs, ys = self.threats.candidate_mask().nonzero()
+        i = self.rng.randrange(len(xs))
+        return int(xs[i]), int(ys[i])
+
+
+class ReplayPlayer(RandomPlayer):
+    """Plays the moves of a logged training game, falling back to random moves once they no longer fit."""
+
+    def __init__(self, board_size, log_file, rng=None):
+        super().__init__(board_size, rng)
+        self.log = open_training_log(log_file)
+        if self.log is None or len(self.log) == 0:
+            raise ValueError(f"No logged games at {log_file}")
+        self.moves = []
+
+    def reset(self, game_index):
+        super().reset(game_index)
+        self.moves = self.log.episode_moves(game_index % len(self.log))
+
+    def move(self, game):
+        idx = len(game.moves)
+        if idx < len(self.moves):
+            _, x, y = self.moves[idx]
+            if game.is_valid_move(x, y):
+                return x, y
+        return super().move(game)
+
+
+class PolicyPlayer:
+    """Plays the agent's most likely legal move; one network evaluation per move."""
+
+    def __init__(self, agent, device='cpu'):
+        self.agent = agent
+        self.device = device
+        self.evaluations = 0
+
+    def reset(self, game_index):
+        pass
+
+    def move(self, game):
+        with torch.no_grad():
+            action, _ = select_action(self.agent, board_to_tensor(game.board, self.device),
+                                      legal_move_mask(game.board, self.device), greedy=True)
+        self.evaluations += 1
+        return divmod(action.item(), game.board_size)
+
+
+class SearchPlayer:
+    """MCTS with the agent, given a simulation count or a time budget per move."""
+
+    def __init__(self, agent, board_size, num_simulations=None, time_budget=None, device='cpu'):
+        self.search = MCTS(agent, board_size, device, num_simulations=num_simulations, time_budget=time_budget,
+                           table=TranspositionTable(), use_threats=True, canonical=True)
+        self.evaluations = 0
+
+    def reset(self, game_index):
+        self.search.table.clear()
+
+    def move(self, game):
+        x, y = self.search.best_move(game)
+        self.evaluations += self.search.last_stats['evaluations']  # Leaves that reached the network
+        return x, y
+
+
+def make_player(spec, board_size, device='cpu', rng=None):
+    """Build a player from a spec string: kind[:budget][:path]. Random moves are drawn from `rng`."""
+    kind, *args = spec.split(':')
+    if kind not in PLAYER_KINDS:
+        raise ValueError(f"Unknown player {spec!r}, expected one of {PLAYER_KINDS}")
+    if kind == 'random':
+        return RandomPlayer(board_size, rng)
+    if kind == 'replay':
+        log_file = args[0] if args else os.path.join(os.path.dirname(model_path(board_size)), 'training_log.txt')
+        return ReplayPlayer(board_size, log_file, rng)
+    budget = None
+    if kind == 'search':
+        budget = args.pop(0) if args else '200'
+    agent = build_agent(board_size, args[0] if args else model_path(board_size), device)
+    if kind == 'policy':
+        return PolicyPlayer(agent, device)
+    if budget.endswith('s'):
+        return SearchPlayer(agent, board_size, time_budget=float(budget[:-1]), device=device)
+    return SearchPlayer(agent, board_size, num_simulations=int(budget), device=device)
+
+
+def play_game(game, players):
+    """Play one game between players[0] (Black) and players[1] (White).
+
+    Returns the winner (0 for a draw) and the per-move latencies in seconds of each player.
+    Raises ValueError if a player picks an occupied cell.
+    """
+    game.reset()
+    latencies = ([], [])
+    winner = 0
+    while not game.is_full():
+        side = game.current_player - 1
+        start = time.perf_counter()
+        x, y = players[side].move(game)
+        latencies[side].append(time.perf_counter() - start)
+        board, done = game.step((x, y))
+        if board is None:
+            raise ValueError(f"Player {side + 1} chose the occupied cell {(x, y)}")
+        if done:
+            winner = side + 1
+            break
+    return winner, latencies
+
+
+def play_games(spec_a, spec_b, board_size, game_indices, seed=0):
+    """Play the given games of a match; A is Black in even-numbered games.
+
+    Randomness comes from generators seeded with `seed`; the global RNG states are left as they were.
+    """
+    rng = random.Random(seed)
+    with torch.random.fork_rng(devices=[]):
+        torch.manual_seed(seed)  # Layers missing from a checkpoint are initialized the same way every run
+        players = (make_player(spec_a, board_size, rng=rng), make_player(spec_b, board_size, rng=rng))
+    game = GobangGame(board_size)
+    results = []
+    for index in game_indices:
+        for player in players:
+            player.reset(index)
+        evaluations = [player.evaluations for player in players]
+        order = (0, 1) if index % 2 == 0 else (1, 0)  # order[color] = player index
+        winner, latencies = play_game(game, (players[order[0]], players[order[1]]))
+        results.append({'game': index, 'winner': 'draw' if winner == 0 else 'ab'[order[winner - 1]],
+                        'moves': len(game.moves),
+                        'latencies': [latencies[order.index(p)] for p in (0, 1)],
+                        'evaluations': [players[p].evaluations - evaluations[p] for p in (0, 1)]})
+    return results
+
+
+def arena_worker(spec_a, spec_b, board_size, game_indices, seed):
+    """play_games in a worker process, one thread per process."""
+    torch.set_num_threads(1)
+    return play_games(spec_a, spec_b, board_size, game_indices, seed)
+
+
+def score_interval(score, n, z=1.96):
+    """Wilson confidence interval of a score (wins plus half the draws, per game) over `n` games."""
+    if n == 0:
+        return 0.0, 1.0
+    center = (score + z * z / (2 * n)) / (1 + z * z / n)
+    margin = z * math.sqrt(score * (1 - score) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(center - margin, 0.0), min(center + margin, 1.0)
+
+
+def elo_difference(score, n):
+    """Elo rating difference implied by a score; clamped by half a game so sweeps stay finite."""
+    score = min(max(score, 0.5 / max(n, 1)), 1 - 0.5 / max(n, 1))
+    return -400 * math.log10(1 / score - 1)
+
+
+def summarize(spec_a, spec_b, board_size, results, seconds):
+    n = len(results)
+    wins_a = sum(r['winner'] == 'a' for r in results)
+    wins_b = sum(r['winner'] == 'b' for r in results)
+    draws = n - wins_a - wins_b
+    score = (wins_a + 0.5 * draws) / n if n else 0.0
+    low, high = score_interval(score, n)
+    moves = sum(r['moves'] for r in results)
+    players = {}
+    for p, spec in enumerate((spec_a, spec_b)):
+        latencies = np.asarray([t for r in results for t in r['latencies'][p]]) * 1000
+        think = latencies.sum() / 1000
+        evaluations = sum(r['evaluations'][p] for r in results)
+        players['ab'[p]] = {
+            'spec': spec, 'wins': wins_a if p == 0 else wins_b, 'moves': len(latencies),
+            'evaluations': evaluations, 'evaluations_per_sec': evaluations / think if think > 0 else 0.0,
+            'latency_ms': {f"p{q}": float(np.percentile(latencies, q)) if len(latencies) else 0.0
+                           for q in (50, 90, 99)}}
+    return {'board_size': board_size, 'games': n, 'draws': draws,
+            'score_a': score, 'score_a_ci95': [low, high],
+            'elo_a_minus_b': elo_difference(score, n),
+            'elo_ci95': [elo_difference(low, n), elo_difference(high, n)],
+            'seconds': seconds, 'moves': moves, 'moves_per_sec': moves / seconds if seconds > 0 else 0.0,
+            'mean_game_length': moves / n if n else 0.0, 'players': players}
+
+
+def run_arena(spec_a, spec_b, games=100, board_size=15, num_workers=0, seed=0):
+    """Play `games` games between two player specs, alternating colors, and return the summary.
+
+    With `num_workers` > 0 the games are split over that many processes.
+    """
+    start = time.perf_counter()
+    if num_workers > 0:
+        chunks = [list(range(w, games, num_workers)) for w in range(num_workers)]
+        ctx = mp.get_context('spawn')
+        with ctx.Pool(num_workers) as pool:
+            parts = pool.starmap(arena_worker, [(spec_a, spec_b, board_size, chunk, seed + w)
+                                                for w, chunk in enumerate(chunks) if chunk])
+        results = sorted((r for part in parts for r in part), key=lambda r: r['game'])
+    else:
+        results = play_games(spec_a, spec_b, board_size, range(games), seed)
+    return summarize(spec_a, spec_b, board_size, results, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a match between two Gobang players.")
+    parser.add_argument("player_a", help="random | replay[:log] | policy[:model] | search[:sims|SECONDSs][:model]")
+    parser.add_argument("player_b")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--board-size", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = play in this process)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    summary = run_arena(args.player_a, args.player_b, args.games, args.board_size, args.workers, args.seed)
+    a, b = summary['players']['a'], summary['players']['b']
+    print(f"{args.player_a} vs {args.player_b}: {a['wins']}-{b['wins']}-{summary['draws']} "
+          f"score {summary['score_a']:.3f} (95% CI {summary['score_a_ci95'][0]:.3f}-{summary['score_a_ci95'][1]:.3f}), "
+          f"Elo {summary['elo_a_minus_b']:+.0f}")
+    print(f"{summary['moves_per_sec']:.1f} moves/s; evals/s {a['evaluations_per_sec']:.0f} / "
+          f"{b['evaluations_per_sec']:.0f}; p50 latency {a['latency_ms']['p50']:.2f} / {b['latency_ms']['p50']:.2f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
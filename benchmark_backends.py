@@ -0,0 +1,45 @@
+import argparse
+import time
+import numpy as np
+from gobang_game import create_game
+
+
+def random_games(board_size, num_games, seed=0):
+    """Pre-generate random move orders so every backend replays the same games."""
+    rng = np.random.default_rng(seed)
+    cells = board_size * board_size
+    return [[divmod(int(a), board_size) for a in rng.permutation(cells)] for _ in range(num_games)]
+
+
+def benchmark(backend, board_size, games):
+    """Play the given games on one backend and return (moves/second, copies/second)."""
+    game = create_game(board_size, backend=backend)
+    moves = 0
+    start = time.perf_counter()
+    for order in games:
+        game.reset()
+        for action in order:
+            _, done = game.step(action)
+            moves += 1
+            if done or game.is_full():
+                break
+    move_rate = moves / (time.perf_counter() - start)
+
+    copies = 10000
+    start = time.perf_counter()
+    for _ in range(copies):
+        game.copy()
+    copy_rate = copies / (time.perf_counter() - start)
+    return move_rate, copy_rate
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare moves/second of the Gobang game backends.")
+    parser.add_argument("--board-size", type=int, default=15)
+    parser.add_argument("--games", type=int, default=200)
+    args = parser.parse_args()
+
+    games = random_games(args.board_size, args.games)
+    for backend in ('array', 'bitboard'):
+        move_rate, copy_rate = benchmark(backend, args.board_size, games)
+        print(f"{backend:>8}: {move_rate:10.0f} moves/s  {copy_rate:10.0f} copies/s")
@@ -0,0 +1,62 @@
+import os
+import random
+import numpy as np
+import torch
+
+CHECKPOINT_FILE = 'checkpoint.pth'
+
+
+def atomic_save(obj, path):
+    """torch.save `obj` to `path` through a temporary file and a rename.
+
+    A crash while saving leaves the previous file intact instead of a
+    truncated one.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def rng_state():
+    """State of every random number generator training draws from."""
+    state = {'python': random.getstate(), 'numpy': np.random.get_state(), 'torch': torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def save_training_checkpoint(path, agent, optimizer, episode, move_log, buffer=None):
+    """Atomically save everything needed to resume training after `episode` episodes.
+
+    Holds the model and optimizer state, the RNG states, the episode counter,
+    the end offsets of the move logs and, if given, the replay buffer.
+    """
+    atomic_save({'model': agent.state_dict(), 'optimizer': optimizer.state_dict(), 'rng': rng_state(),
+                 'episode': episode, 'log_offsets': move_log.offsets(),
+                 'buffer': buffer.state_dict() if buffer is not None else None}, path)
+
+
+def load_training_checkpoint(path, agent, optimizer, buffer=None):
+    """Restore a checkpoint saved by save_training_checkpoint into `agent`, `optimizer` and `buffer`.
+
+    Also restores the RNG states. Returns (episode, log_offsets).
+    """
+    # Loaded on the CPU (where the RNG state must live); the NumPy arrays and RNG tuples need weights_only=False
+    checkpoint = torch.load(path, map_location='cpu', weights_only=False)
+    agent.load_state_dict(checkpoint['model'])
+    optimizer.load_state_dict(checkpoint['optimizer'])
+    if buffer is not None and checkpoint['buffer'] is not None:
+        buffer.load_state_dict(checkpoint['buffer'])
+    set_rng_state(checkpoint['rng'])
+    return checkpoint['episode'], checkpoint['log_offsets']
@@ -0,0 +1,81 @@
+import torch
+import torch.nn as nn
+
+# Board value of cells outside the board, used to pad boards of different sizes into one batch
+PAD = -1
+ARCH = 'conv_policy'
+
+
+class ConvPolicyNet(nn.Module):
+    """Fully convolutional policy that works on any board size.
+
+    Takes (B, 1, n, n) boards in the usual encoding (0 empty, 1 Black, 2 White,
+    PAD outside the board) and returns (B, n * n) move logits, like
+    GobangAgent. Features are zeroed outside the board after every layer, so
+    a board padded into a larger batch gets the same logits as on its own.
+    """
+
+    def __init__(self, channels=64, num_blocks=4):
+        super().__init__()
+        self.config = {'channels': channels, 'num_blocks': num_blocks}
+        # Input planes: Black, White, empty, on the board, White to move
+        self.stem = nn.Conv2d(5, channels, 3, padding=1)
+        # Residual blocks of two 3x3 convolutions each
+        self.convs1 = nn.ModuleList([nn.Conv2d(channels, channels, 3, padding=1) for _ in range(num_blocks)])
+        self.convs2 = nn.ModuleList([nn.Conv2d(channels, channels, 3, padding=1) for _ in range(num_blocks)])
+        self.head = nn.Conv2d(channels, 1, 1)
+
+    def forward(self, boards):
+        x = boards[:, 0]
+        black = (x == 1).float()
+        white = (x == 2).float()
+        on_board = (x >= 0).float()
+        # Black moves first, so White is to move whenever Black has more stones
+        white_to_move = (black.flatten(1).sum(1) > white.flatten(1).sum(1)).float().view(-1, 1, 1) * on_board
+        planes = torch.stack([black, white, (x == 0).float(), on_board, white_to_move], dim=1)
+        mask = on_board.unsqueeze(1)
+        h = torch.relu(self.stem(planes)) * mask
+        for conv1, conv2 in zip(self.convs1, self.convs2):
+            h = torch.relu(h + conv2(torch.relu(conv1(h)) * mask)) * mask
+        return self.head(h).flatten(1)
+
+
+def save_checkpoint(net, path):
+    """Save a ConvPolicyNet with its architecture, so it can be loaded for any board size."""
+    torch.save({'arch': ARCH, 'config': net.config, 'state_dict': net.state_dict()}, path)
+
+
+def is_conv_checkpoint(checkpoint):
+    return isinstance(checkpoint, dict) and checkpoint.get('arch') == ARCH
+
+
+def load_checkpoint(path, device='cpu'):
+    """Load a ConvPolicyNet saved by save_checkpoint. Raises ValueError for other checkpoints."""
+    checkpoint = torch.load(path, map_location=device)
+    if not is_conv_checkpoint(checkpoint):
+        raise ValueError(f"{path} is not a size-agnostic (conv_policy) checkpoint")
+    return from_checkpoint(checkpoint, device)
+
+
+def from_checkpoint(checkpoint, device='cpu'):
+    net = ConvPolicyNet(**checkpoint['config'])
+    net.load_state_dict(checkpoint['state_dict'])
+    return net.to(device)
+
+
+def pad_boards(states, size):
+    """Pad (B, 1, n, n) boards with PAD to (B, 1, size, size), keeping them in the top-left corner."""
+    n = states.shape[-1]
+    if n == size:
+        return states
+    return nn.functional.pad(states, (0, size - n, 0, size - n), value=PAD)
+
+
+def pad_actions(actions, masks, n, size):
+    """Re-index flat actions and (B, n * n) legal masks of n x n boards for size x size boards."""
+    if n == size:
+        return actions, masks
+    x, y = actions // n, actions % n
+    padded = torch.zeros(len(masks), size, size, dtype=masks.dtype, device=masks.device)
+    padded[:, :n, :n] = masks.view(-1, n, n)
+    return x * size + y, padded.flatten(1)
@@ -0,0 +1,300 @@
+import argparse
+import json
+import os
+import re
+import numpy as np
+
+# A record named `base` is stored in three files:
+#   base.moves    every move of every game, one flat cell index (x * board_size + y) each
+#   base.offsets  int64 end offset of every game in base.moves
+#   base.json     board size and the dtype of base.moves
+MOVES_EXT, OFFSETS_EXT, META_EXT = '.moves', '.offsets', '.json'
+
+TEXT_LINE = re.compile(r"Episode (\d+) - (Black|White) Move: ([A-Z])(\d+)")
+
+
+def move_dtype(board_size):
+    """One byte per move when every cell index fits in a byte, two otherwise."""
+    return np.uint8 if board_size * board_size <= 256 else np.uint16
+
+
+def record_exists(path):
+    return os.path.exists(path + META_EXT)
+
+
+class GameRecordWriter:
+    """Append-only writer for the binary game record format.
+
+    Moves and offsets are collected in memory and written in chunks of about
+    `chunk_size` moves, so the training loop does no I/O for most games.
+    When appending, `resume_at=(num_moves, num_episodes)` first cuts the record
+    back to that point, dropping games logged after a training checkpoint.
+    """
+
+    def __init__(self, path, board_size, chunk_size=65536, append=False, resume_at=None):
+        self.path = path
+        self.board_size = board_size
+        self.dtype = move_dtype(board_size)
+        self.chunk_size = chunk_size
+        if append and record_exists(path):
+            with open(path + META_EXT) as f:
+                if json.load(f)['board_size'] != board_size:
+                    raise ValueError(f"Game record {path} is for a different board size")
+            if resume_at is not None:
+                os.truncate(path + MOVES_EXT, resume_at[0] * np.dtype(self.dtype).itemsize)
+                os.truncate(path + OFFSETS_EXT, resume_at[1] * 8)
+            self.num_moves = os.path.getsize(path + MOVES_EXT) // np.dtype(self.dtype).itemsize
+            self.num_episodes = os.path.getsize(path + OFFSETS_EXT) // 8
+        else:
+            append = False
+            self.num_moves = 0
+            self.num_episodes = 0
+            with open(path + META_EXT, 'w') as f:
+                json.dump({'board_size': board_size, 'dtype': np.dtype(self.dtype).name}, f)
+        mode = 'ab' if append else 'wb'
+        self.moves_file = open(path + MOVES_EXT, mode)
+        self.offsets_file = open(path + OFFSETS_EXT, mode)
+        self.pending_moves = []
+        self.pending_offsets = []
+
+    def write_episode(self, actions):
+        """Add one game given as a sequence of flat cell indices."""
+        self.pending_moves.extend(actions)
+        self.num_moves += len(actions)
+        self.num_episodes += 1
+        self.pending_offsets.append(self.num_moves)
+        if len(self.pending_moves) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered games to disk."""
+        self.moves_file.write(np.asarray(self.pending_moves, dtype=self.dtype).tobytes())
+        self.offsets_file.write(np.asarray(self.pending_offsets, dtype=np.int64).tobytes())
+        self.moves_file.flush()
+        self.offsets_file.flush()
+        self.pending_moves = []
+        self.pending_offsets = []
+
+    def close(self):
+        self.flush()
+        self.moves_file.close()
+        self.offsets_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GameRecordReader:
+    """Memory-mapped reader for the binary game record format."""
+
+    def __init__(self, path):
+        with open(path + META_EXT) as f:
+            meta = json.load(f)
+        self.board_size = meta['board_size']
+        self.moves = self._memmap(path + MOVES_EXT, np.dtype(meta['dtype']))
+        self.ends = self._memmap(path + OFFSETS_EXT, np.dtype(np.int64))
+
+    @staticmethod
+    def _memmap(filename, dtype):
+        if os.path.getsize(filename) == 0:
+            return np.zeros(0, dtype=dtype)  # np.memmap cannot map an empty file
+        return np.memmap(filename, dtype=dtype, mode='r')
+
+    def __len__(self):
+        return len(self.ends)
+
+    def episode(self, k):
+        """Flat cell indices of the moves of game `k` (0-based)."""
+        start = self.ends[k - 1] if k > 0 else 0
+        return self.moves[start:self.ends[k]]
+
+    def episode_moves(self, k):
+        """Moves of game `k` as (player, x, y) tuples, Black moving first."""
+        return [('Black' if i % 2 == 0 else 'White',) + divmod(int(action), self.board_size)
+                for i, action in enumerate(self.episode(k))]
+
+
+class TextLogReader:
+    """Lazily decoding reader for the text training log.
+
+    On first use the log is scanned once to find the byte offset where every
+    game starts; the offsets are cached next to the log in `<log>.index.npy`
+    and reused while the log keeps the same size. Moves are only decoded for
+    the games that are actually read.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.skipped_lines = 0  # Lines that could not be parsed while decoding
+        self.starts = self._load_index()
+
+    def _load_index(self):
+        index_path = self.path + '.index.npy'
+        file_size = os.path.getsize(self.path)
+        if os.path.exists(index_path):
+            index = np.load(index_path)
+            if len(index) and index[0] == file_size:  # First entry: size of the log when indexed
+                return index[1:]
+        starts = self._build_index()
+        try:
+            np.save(index_path, np.concatenate(([file_size], starts)).astype(np.int64))
+        except OSError:
+            pass  # Read-only location: keep the index in memory only
+        return starts
+
+    def _build_index(self):
+        """Byte offsets where each game starts, followed by the end of the file."""
+        starts = []
+        offset = 0
+        current_episode = None
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if line.startswith(b'Episode '):
+                    episode = line[8:line.find(b' ', 8)]
+                    if episode != current_episode:
+                        starts.append(offset)
+                        current_episode = episode
+                offset += len(line)
+        starts.append(offset)
+        return np.asarray(starts, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def episode_moves(self, k):
+        """Moves of game `k` (0-based) as (player, x, y) tuples."""
+        with open(self.path, 'rb') as f:
+            f.seek(self.starts[k])
+            chunk = f.read(int(self.starts[k + 1] - self.starts[k])).decode('ascii', errors='replace')
+        moves = []
+        for line in chunk.splitlines():
+            match = TEXT_LINE.match(line)
+            if not match:
+                self.skipped_lines += 1
+                continue
+            # The text log writes the column letter for y and the row number for x
+            moves.append((match.group(2), int(match.group(4)) - 1, ord(match.group(3)) - 65))
+        return moves
+
+
+def open_training_log(log_file):
+    """Open the games logged for a model directory's training log.
+
+    Prefers the binary game record next to `log_file` and falls back to the
+    text log itself. Returns None if neither exists.
+    """
+    record_path = os.path.splitext(log_file)[0]
+    if record_exists(record_path):
+        return GameRecordReader(record_path)
+    if os.path.exists(log_file):
+        return TextLogReader(log_file)
+    return None
+
+
+def format_text_move(episode, move_idx, action, board_size):
+    """One line of the text training log, e.g. 'Episode 3 - White Move: E2'."""
+    x, y = divmod(action, board_size)
+    player = 'Black' if move_idx % 2 == 0 else 'White'
+    return f"Episode {episode} - {player} Move: {chr(y + 65)}{x + 1}\n"
+
+
+class TrainingLog:
+    """Move log written during training: a binary game record, plus an optional text log.
+
+    The text log keeps the old 'Episode N - Player Move: A1' format but is only
+    written when `text_log` is set, and is buffered by the file object instead
+    of being flushed after every line.
+
+    Passing the `offsets()` saved with a training checkpoint as `resume_at`
+    appends to the existing logs, cut back to where the checkpoint was taken.
+    """
+
+    def __init__(self, model_dir, board_size, text_log=False, resume_at=None):
+        self.board_size = board_size
+        append = resume_at is not None
+        self.record = GameRecordWriter(os.path.join(model_dir, 'training_log'), board_size, append=append,
+                                       resume_at=(resume_at['moves'], resume_at['episodes']) if append else None)
+        self.text_file = None
+        if text_log:
+            text_path = os.path.join(model_dir, 'training_log.txt')
+            if append and resume_at.get('text') is not None and os.path.exists(text_path):
+                os.truncate(text_path, resume_at['text'])
+            self.text_file = open(text_path, 'a' if append else 'w')
+
+    @property
+    def num_episodes(self):
+        return self.record.num_episodes
+
+    def write_episode(self, actions):
+        actions = [int(action) for action in actions]
+        self.record.write_episode(actions)
+        if self.text_file is not None:
+            episode = self.record.num_episodes
+            self.text_file.write(''.join(format_text_move(episode, i, action, self.board_size)
+                                         for i, action in enumerate(actions)))
+
+    def offsets(self):
+        """Flush both logs and return their current end, for saving with a checkpoint."""
+        self.record.flush()
+        text = None
+        if self.text_file is not None:
+            self.text_file.flush()
+            text = self.text_file.tell()
+        return {'moves': self.record.num_moves, 'episodes': self.record.num_episodes, 'text': text}
+
+    def close(self):
+        self.record.close()
+        if self.text_file is not None:
+            self.text_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def convert_text_log(text_path, record_path, board_size):
+    """Convert a text training log into the binary game record format.
+
+    Returns the number of games written. Lines that are not moves are skipped.
+    """
+    with GameRecordWriter(record_path, board_size) as writer:
+        current_episode, actions = None, []
+        with open(text_path) as f:
+            for line in f:
+                match = TEXT_LINE.match(line)
+                if not match:
+                    continue
+                episode = int(match.group(1))
+                if episode != current_episode and actions:
+                    writer.write_episode(actions)
+                    actions = []
+                current_episode = episode
+                # The text log writes the column letter for y and the row number for x
+                actions.append((int(match.group(4)) - 1) * board_size + ord(match.group(3)) - 65)
+        if actions:
+            writer.write_episode(actions)
+        return writer.num_episodes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a text training log to the binary game record format.")
+    parser.add_argument("text_log", help="Path of the text log, e.g. models/15x15/training_log.txt")
+    parser.add_argument("--board-size", type=int,
+                        help="Board size (default: taken from the NxN directory name)")
+    parser.add_argument("--output", help="Record path without extension (default: next to the text log)")
+    args = parser.parse_args()
+
+    board_size = args.board_size
+    if board_size is None:
+        match = re.fullmatch(r"(\d+)x\1", os.path.basename(os.path.dirname(os.path.abspath(args.text_log))))
+        if not match:
+            parser.error("Could not infer the board size, pass --board-size")
+        board_size = int(match.group(1))
+    output = args.output or os.path.splitext(args.text_log)[0]
+    count = convert_text_log(args.text_log, output, board_size)
+    print(f"Converted {count} games from {args.text_log} to {output}{MOVES_EXT}")
@@ -1,12 +1,15 @@
+import argparse
+import os
 import tkinter as tk
 from tkinter import messagebox
 import torch
 from gobang_game import GobangGame
-from gobang_agent import GobangAgent
+from model_cache import ModelCache, model_path
+from inference_server import InferenceClient
 from gobang_gui import GobangGameGUI
 
 class GobangApp(tk.Tk):
-    def __init__(self, default_board_size=15):
+    def __init__(self, default_board_size=15, server_port=None):
         super().__init__()
         self.title("Gobang Game")
         self.geometry("900x700")
@@ -16,7 +19,15 @@ class GobangApp(tk.Tk):
 
         # Initialize game and agent
         self.game = GobangGame(board_size=self.board_size)
-        self.agent = GobangAgent(board_size=self.board_size).to(self.device)
+        self.models = ModelCache(device=self.device)  # Loaded models stay warm across board size changes
+        self.agent = None
+        self.agent_loaded = False  # "Hard AI" falls back to replaying the training log without a model
+        if server_port is not None:
+            # Share the model of a local inference server (inference_server.py) with other games
+            self.agent = InferenceClient(server_port)
+            self.agent_loaded = True
+        elif os.path.exists(model_path(self.board_size)):
+            self.load_model(model_path(self.board_size))
 
         # Define the path to the training log file
         log_file_path = f"models/{self.board_size}x{self.board_size}/training_log.txt"
@@ -33,8 +44,14 @@ class GobangApp(tk.Tk):
         self.move_log = tk.Text(menu_frame, width=30, height=20, bg='white')
         self.move_log.pack(pady=5)
 
+        # Shows "AI thinking..." while the AI move is computed in the background
+        self.status_label = tk.Label(menu_frame, bg='lightgray', font=("Arial", 12))
+        self.status_label.pack(pady=5)
+
         # Pass the log file path to the GUI class
-        self.canvas = GobangGameGUI(self, self.game, self.agent, self.mode_var, self.move_log, self.turn_label, log_file, width=650, height=650)
+        agent = self.agent if self.agent_loaded else None
+        self.canvas = GobangGameGUI(self, self.game, agent, self.mode_var, self.move_log, self.turn_label, log_file,
+                                    status_label=self.status_label, width=650, height=650)
         self.canvas.pack(side=tk.LEFT, padx=10)
 
         tk.Label(menu_frame, text="Choose Game Mode", bg='lightgray', font=("Arial", 14)).pack(pady=5)
@@ -45,15 +62,15 @@ class GobangApp(tk.Tk):
             tk.Button(menu_frame, text=text, command=lambda v=value: self.change_mode(v)).pack(pady=5)
 
         tk.Button(menu_frame, text="Surrender", command=self.give_up).pack(pady=5)
+        tk.Button(menu_frame, text="Cancel AI Move", command=self.canvas.cancel_ai_move).pack(pady=5)
 
     def load_model(self, model_path):
         """Load a model with safety checks."""
         try:
-            checkpoint = torch.load(model_path)
-            # Load the state dictionary with strict=False to ignore mismatched layers
-            self.agent.load_state_dict(checkpoint, strict=False)
-            self.agent.eval()
-            print(f"Successfully loaded model: {model_path}")
+            # Reuses the cached model unless the checkpoint changed; mismatched layers are ignored
+            self.agent = self.models.get(self.board_size, model_path)
+            self.agent_loaded = True
+            print(f"Successfully loaded model: {model_path} ({self.agent.kind})")
         except FileNotFoundError:
             print(f"Model not found at {model_path}")
             messagebox.showerror("Error", f"Model not found for {self.board_size}x{self.board_size} board.")
@@ -65,12 +82,14 @@ class GobangApp(tk.Tk):
         """Change the board size dynamically."""
         self.board_size = board_size
         self.game = GobangGame(board_size=self.board_size)
-        self.agent = GobangAgent(board_size=self.board_size).to(self.device)  # Reinitialize the agent
-        self.load_model(f"models/{board_size}x{board_size}/model.pth")
+        self.agent = None
+        self.agent_loaded = False
+        self.load_model(model_path(board_size))
 
     def change_mode(self, mode):
         if messagebox.askyesno("Confirm Mode Change", f"Start a new game in {mode} mode?"):
             self.mode_var.set(mode)
+            self.canvas.cancel_ai_move()
             self.canvas.game.reset()
             self.move_log.delete(1.0, tk.END)
             self.canvas.draw_board()
@@ -78,10 +97,14 @@ class GobangApp(tk.Tk):
     def give_up(self):
         winner = "White" if self.canvas.game.current_player == 1 else "Black"
         messagebox.showinfo("Game Over", f"{winner} wins!")
+        self.canvas.cancel_ai_move()
         self.canvas.game.reset()
         self.canvas.draw_board()
         self.move_log.delete(1.0, tk.END)
 
 if __name__ == "__main__":
-    app = GobangApp()
+    parser = argparse.ArgumentParser(description="Play Gobang.")
+    parser.add_argument("--server-port", type=int, help="Use the model of a local inference server on this port")
+    args = parser.parse_args()
+    app = GobangApp(server_port=args.server_port)
     app.mainloop()
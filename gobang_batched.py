@@ -0,0 +1,79 @@
+import torch
+import torch.nn.functional as F
+
+
+class BatchedGobangGame:
+    """Vector environment that plays many Gobang games at once.
+
+    All boards live in one (num_games, board_size, board_size) int8 tensor, so a
+    whole batch of moves is applied, checked for wins and turned into network
+    input with a handful of tensor ops. Finished games are reset automatically.
+    """
+
+    def __init__(self, num_games, board_size=15, device='cpu'):
+        if board_size < 5:
+            raise ValueError("Board size must be at least 5 to fit five in a row")
+        self.num_games = num_games
+        self.board_size = board_size
+        self.device = torch.device(device)
+
+        # One 5x5 kernel per direction: horizontal, vertical, diagonal (both)
+        kernels = torch.zeros(4, 1, 5, 5)
+        kernels[0, 0, 2, :] = 1
+        kernels[1, 0, :, 2] = 1
+        kernels[2, 0] = torch.eye(5)
+        kernels[3, 0] = torch.eye(5).flip(1)
+        self.kernels = kernels.to(self.device)
+        self.rows = torch.arange(num_games, device=self.device)
+        self.reset()
+
+    def reset(self):
+        """Reset every game board."""
+        shape = (self.num_games, self.board_size, self.board_size)
+        self.boards = torch.zeros(shape, dtype=torch.int8, device=self.device)
+        self.current_player = torch.ones(self.num_games, dtype=torch.int8, device=self.device)
+        self.move_count = torch.zeros(self.num_games, dtype=torch.long, device=self.device)
+        return self.boards
+
+    def reset_games(self, finished):
+        """Reset only the games selected by the boolean tensor `finished`."""
+        self.boards[finished] = 0
+        self.current_player[finished] = 1
+        self.move_count[finished] = 0
+
+    def observations(self):
+        """Boards as float network input of shape (num_games, 1, board_size, board_size)."""
+        return self.boards.unsqueeze(1).float()
+
+    def legal_mask(self):
+        """Boolean mask of shape (num_games, board_size * board_size), True for empty cells."""
+        return (self.boards == 0).view(self.num_games, -1)
+
+    def step(self, actions):
+        """Play one move in every game.
+
+        `actions` holds one flat cell index (x * board_size + y) per game.
+        Returns (boards, winners, done): `winners` is the player who just won
+        each game (0 if none) and `done` marks games that ended on this move,
+        which have already been reset in `boards`.
+        """
+        actions = actions.to(self.device, dtype=torch.long)
+        flat = self.boards.view(self.num_games, -1)
+        if (flat[self.rows, actions] != 0).any():
+            raise ValueError("Batched step received a move on an occupied cell")
+        flat[self.rows, actions] = self.current_player
+        self.move_count += 1
+
+        winners = self.check_winners()
+        done = (winners > 0) | (self.move_count == self.board_size * self.board_size)
+        self.current_player = 3 - self.current_player  # Switch player
+        if done.any():
+            self.reset_games(done)
+        return self.boards, winners, done
+
+    def check_winners(self):
+        """Return the current player of every game that has five in a row, else 0."""
+        stones = (self.boards == self.current_player.view(-1, 1, 1)).unsqueeze(1).float()
+        counts = F.conv2d(stones, self.kernels, padding=2)
+        won = counts.flatten(1).amax(dim=1) >= 5
+        return torch.where(won, self.current_player, torch.zeros_like(self.current_player))
@@ -0,0 +1,160 @@
+import numpy as np
+from zobrist import zobrist_keys
+
+
+class LazyBoard:
+    """Live view of a BitboardGobangGame's board, decoded only when it is used.
+
+    step() and reset() return this instead of the decoded array, so playing
+    moves never pays for the NumPy decode. Anything NumPy-like (indexing,
+    .reshape, np.asarray, ...) decodes the current board on first use.
+    """
+
+    __slots__ = ('_game',)
+
+    def __init__(self, game):
+        self._game = game
+
+    def __array__(self, dtype=None, copy=None):
+        board = self._game.board
+        return board if dtype is None else board.astype(dtype)
+
+    def __getitem__(self, index):
+        return self._game.board[index]
+
+    def __len__(self):
+        return self._game.board_size
+
+    def __getattr__(self, name):
+        return getattr(self._game.board, name)
+
+
+class BitboardGobangGame:
+    """Gobang game state stored as one integer bitboard per player.
+
+    Cell (x, y) maps to bit x * (board_size + 1) + y. The extra, always-empty
+    column at the end of every row keeps horizontal and diagonal shifts from
+    wrapping onto the next row, so five in a row is found with four shifted ANDs.
+
+    Takes the same arguments as GobangGame. `full_scan` changes nothing here:
+    the shifted ANDs already check the whole board after every move.
+    """
+
+    def __init__(self, board_size=15, full_scan=False):
+        self.board_size = board_size
+        self.full_scan = full_scan
+        self.stride = board_size + 1
+        self.zobrist = zobrist_keys(board_size)
+        # Bit shifts for the directions: horizontal, vertical, diagonal (both)
+        self.shifts = (1, self.stride, self.stride + 1, self.stride - 1)
+        self.full_mask = 0
+        for x in range(board_size):
+            self.full_mask |= ((1 << board_size) - 1) << (x * self.stride)
+        self.reset()
+
+    def reset(self):
+        """Reset the game board."""
+        self.bits = [0, 0, 0]  # Index 1 and 2 hold the stones of each player
+        self.current_player = 1  # Player 1 starts
+        self.empty_count = self.board_size * self.board_size
+        self.moves = []  # Stack of played moves, used by undo()
+        self.winner = 0
+        self.hash = 0  # Zobrist hash of the position, kept in sync by step() and undo()
+        self._array = None  # Decoded board, built on first access to .board
+        self._view = None  # LazyBoard handed out by step() and reset(), made on first use
+        return self.view
+
+    @property
+    def board(self):
+        """The board as a (board_size, board_size) NumPy array, like GobangGame.board."""
+        if self._array is None:
+            self._array = self.to_array()
+        return self._array
+
+    @property
+    def view(self):
+        """The board as a LazyBoard: what step() and reset() return."""
+        if self._view is None:
+            self._view = LazyBoard(self)
+        return self._view
+
+    @property
+    def last_move(self):
+        return self.moves[-1] if self.moves else None
+
+    def to_array(self):
+        """Decode the bitboards into a NumPy array of 0 (empty), 1 and 2."""
+        n, stride = self.board_size, self.stride
+        num_bytes = (n * stride + 7) // 8
+        board = np.zeros(n * stride, dtype=int)
+        for player in (1, 2):
+            raw = np.frombuffer(self.bits[player].to_bytes(num_bytes, 'little'), dtype=np.uint8)
+            cells = np.unpackbits(raw, bitorder='little')[:n * stride]
+            board[cells.astype(bool)] = player
+        return board.reshape(n, stride)[:, :n]
+
+    def step(self, action):
+        """Take an action and update the game state."""
+        x, y = int(action[0]), int(action[1])  # NumPy integers would overflow the shift
+        bit = 1 << (x * self.stride + y)
+        if (self.bits[1] | self.bits[2]) & bit:
+            return None, False  # Invalid move
+        self.bits[self.current_player] |= bit
+        self.hash ^= self.zobrist[self.current_player][x][y]
+        if self._array is not None:
+            self._array[x, y] = self.current_player
+        self.empty_count -= 1
+        self.moves.append((x, y))
+        if self.has_five(self.bits[self.current_player]):
+            self.winner = self.current_player
+        done = self.winner
+        self.current_player = 3 - self.current_player  # Switch player
+        return self.view, done
+
+    def undo(self):
+        """Take back the last move."""
+        x, y = self.moves.pop()
+        self.current_player = 3 - self.current_player
+        self.bits[self.current_player] &= ~(1 << (x * self.stride + y))
+        self.hash ^= self.zobrist[self.current_player][x][y]
+        if self._array is not None:
+            self._array[x, y] = 0
+        self.empty_count += 1
+        self.winner = 0  # Play only continues while nobody has won
+        return self.view
+
+    def copy(self):
+        """Return an independent copy of the game state."""
+        game = BitboardGobangGame.__new__(BitboardGobangGame)
+        game.__dict__.update(self.__dict__)
+        game.bits = list(self.bits)
+        game._array = None  # Decoded lazily, so copies stay a handful of integers
+        game._view = None
+        game.moves = list(self.moves)
+        return game
+
+    def has_five(self, bits):
+        """Check a single player's bitboard for five in a row."""
+        for shift in self.shifts:
+            pairs = bits & (bits >> shift)
+            if pairs & (pairs >> 2 * shift) & (bits >> 4 * shift):
+                return True
+        return False
+
+    def check_winner(self):
+        """Return the winner (1 or 2), or 0 if nobody has won yet."""
+        return self.winner
+
+    def is_valid_move(self, x, y):
+        """Check if the move is valid (inside the board and unoccupied)."""
+        if not (0 <= x < self.board_size and 0 <= y < self.board_size):
+            return False
+        return not ((self.bits[1] | self.bits[2]) >> int(x * self.stride + y)) & 1
+
+    def is_full(self):
+        """Check if the board is full."""
+        return self.empty_count == 0
+
+    def empty_bits(self):
+        """Bitboard of the empty cells."""
+        return self.full_mask & ~(self.bits[1] | self.bits[2])
@@ -1,36 +1,98 @@
 import numpy as np
+from zobrist import zobrist_keys
+
+# Directions: horizontal, vertical, diagonal (both)
+DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1)]
+
 
 class GobangGame:
-    def __init__(self, board_size=15):
+    def __init__(self, board_size=15, full_scan=False):
         self.board_size = board_size
+        self.full_scan = full_scan  # Reference mode: re-scan the whole board after every move
+        self.zobrist = zobrist_keys(board_size)
         self.reset()
 
     def reset(self):
         """Reset the game board."""
         self.board = np.zeros((self.board_size, self.board_size), dtype=int)  # Use a NumPy array
         self.current_player = 1  # Player 1 starts
+        self.empty_count = self.board_size * self.board_size  # Kept in sync by step()
+        self.moves = []  # Stack of played moves, used by undo()
+        self.winner = 0
+        self.hash = 0  # Zobrist hash of the position, kept in sync by step() and undo()
         return self.board
 
+    @property
+    def last_move(self):
+        return self.moves[-1] if self.moves else None
+
     def step(self, action):
         """Take an action and update the game state."""
         x, y = action
-        if self.board[x][y] != 0:
+        if self.board[x, y] != 0:
             return None, False  # Invalid move
-        self.board[x][y] = self.current_player
-        done = self.check_winner()
+        self.board[x, y] = self.current_player
+        self.hash ^= self.zobrist[self.current_player][x][y]
+        self.empty_count -= 1
+        self.moves.append((x, y))
+        if self.full_scan:
+            self.winner = self.scan_winner()
+        elif self.is_winning_move(x, y):
+            self.winner = self.current_player
+        done = self.winner
         self.current_player = 3 - self.current_player  # Switch player
         return self.board, done
 
+    def undo(self):
+        """Take back the last move."""
+        x, y = self.moves.pop()
+        self.board[x, y] = 0
+        self.empty_count += 1
+        self.winner = 0  # Play only continues while nobody has won
+        self.current_player = 3 - self.current_player
+        self.hash ^= self.zobrist[self.current_player][x][y]
+        return self.board
+
+    def copy(self):
+        """Return an independent copy of the game state."""
+        game = GobangGame.__new__(GobangGame)
+        game.__dict__.update(self.__dict__)
+        game.board = self.board.copy()
+        game.moves = list(self.moves)
+        return game
+
+    def is_winning_move(self, x, y):
+        """Check only the four lines through (x, y) for five in a row."""
+        board = self.board
+        player = board[x, y]
+        n = self.board_size
+        for dx, dy in DIRECTIONS:
+            count = 1
+            nx, ny = x + dx, y + dy
+            while 0 <= nx < n and 0 <= ny < n and board[nx, ny] == player:
+                count += 1
+                nx, ny = nx + dx, ny + dy
+            nx, ny = x - dx, y - dy
+            while 0 <= nx < n and 0 <= ny < n and board[nx, ny] == player:
+                count += 1
+                nx, ny = nx - dx, ny - dy
+            if count >= 5:
+                return True
+        return False
+
     def check_winner(self):
-        """Check the entire game board for a winner."""
-        directions = [(1, 0), (0, 1), (1, 1),
-                      (1, -1)]  # Directions: horizontal, vertical, diagonal (both)
+        """Return the winner (1 or 2), or 0 if nobody has won yet."""
+        if self.full_scan:
+            return self.scan_winner()
+        return self.winner
 
+    def scan_winner(self):
+        """Check the entire game board for a winner (reference implementation)."""
         for x in range(self.board_size):
             for y in range(self.board_size):
                 if self.board[x][y] != 0:  # Only check non-empty cells
                     current_player = self.board[x][y]
-                    for dx, dy in directions:
+                    for dx, dy in DIRECTIONS:
                         count = 1
                         for step in range(1, 5):  # Check 4 steps in the direction
                             nx, ny = x + dx * step, y + dy * step
@@ -45,8 +107,21 @@ class GobangGame:
 
     def is_valid_move(self, x, y):
         """Check if the move is valid (inside the board and unoccupied)."""
-        return 0 <= x < self.board_size and 0 <= y < self.board_size and self.board[x][y] == 0
+        return 0 <= x < self.board_size and 0 <= y < self.board_size and self.board[x, y] == 0
 
     def is_full(self):
         """Check if the board is full."""
-        return not np.any(self.board == 0)  # This works correctly with NumPy arrays
+        return self.empty_count == 0
+
+
+def create_game(board_size=15, backend='array', **kwargs):
+    """Create a game with the given state backend ('array' or 'bitboard').
+
+    Both backends take the keyword arguments of GobangGame.
+    """
+    if backend == 'array':
+        return GobangGame(board_size, **kwargs)
+    if backend == 'bitboard':
+        from gobang_bitboard import BitboardGobangGame
+        return BitboardGobangGame(board_size, **kwargs)
+    raise ValueError(f"Unknown game backend: {backend}")
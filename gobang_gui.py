@@ -1,10 +1,53 @@
 import tkinter as tk
 from tkinter import messagebox
 from PIL import Image, ImageTk
+import queue
 import random
+import threading
+import time
+from contextlib import contextmanager
+from game_records import open_training_log
+from mcts import MCTS
+from threat_eval import ThreatEvaluator
+from transposition import TranspositionTable
+
+class RenderTimer:
+    """Collects how long each kind of canvas update takes.
+
+    `hook`, if given, is called as hook(name, elapsed_ms, over_budget) after
+    every measured update, e.g. to print slow frames on large boards.
+    """
+
+    def __init__(self, frame_budget_ms=16.0, hook=None):
+        self.frame_budget_ms = frame_budget_ms
+        self.hook = hook
+        self.stats = {}  # name -> [count, total_ms, max_ms, over_budget]
+
+    @contextmanager
+    def measure(self, name):
+        start = time.perf_counter()
+        yield
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        over_budget = elapsed_ms > self.frame_budget_ms
+        stats = self.stats.setdefault(name, [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += elapsed_ms
+        stats[2] = max(stats[2], elapsed_ms)
+        stats[3] += over_budget
+        if self.hook is not None:
+            self.hook(name, elapsed_ms, over_budget)
+
+    def summary(self):
+        """Per update kind: count, mean and max milliseconds, and how often the frame budget was exceeded."""
+        return {name: {'count': count, 'mean_ms': total / count, 'max_ms': worst, 'over_budget': over}
+                for name, (count, total, worst, over) in self.stats.items()}
+
 
 class GobangGameGUI(tk.Canvas):
-    def __init__(self, master, game, agent, mode_var, move_log, turn_label, log_file, **kwargs):
+    AI_POLL_MS = 20  # How often the Tk loop checks for a finished AI move
+
+    def __init__(self, master, game, agent, mode_var, move_log, turn_label, log_file, status_label=None,
+                 think_time=2.0, simulations=None, frame_budget_ms=16.0, render_hook=None, **kwargs):
         super().__init__(master, **kwargs)
         self.game = game
         self.agent = agent
@@ -20,6 +63,31 @@ class GobangGameGUI(tk.Canvas):
         self.pack(side=tk.LEFT)
         self.move_history = []  # Track move history
 
+        # AI moves are computed on a worker thread within a time budget of think_time seconds
+        self.status_label = status_label  # Shows the "thinking" indicator
+        self.think_time = think_time
+        self.ai_results = queue.Queue()
+        self.ai_request = 0  # Id of the AI move the GUI is waiting for
+        self.ai_cancel = None
+        self.ai_thread = None  # Worker of the latest AI move; at most one runs at a time
+        self.thinking = False
+        # "Hard AI" searches with the agent's policy when a trained model is loaded
+        self.search = None
+        if agent is not None:
+            device = agent.device if hasattr(agent, 'device') else next(agent.parameters()).device
+            self.search = MCTS(agent, self.board_size, device=device,
+                               num_simulations=simulations, table=TranspositionTable(), use_threats=True,
+                               canonical=True)
+        # Candidate moves near the stones, kept in sync with the board for "Easy AI"
+        self.threats = ThreatEvaluator(self.board_size)
+
+        # Persistent canvas items: the grid is drawn once, stones are added one at a time
+        # and a single preview oval is moved around with coords()
+        self.render_timer = RenderTimer(frame_budget_ms=frame_budget_ms, hook=render_hook)
+        self.draw_grid()
+        self.preview = self.create_oval(0, 0, 0, 0, width=2, state='hidden')
+        self.preview_cell = None
+
         # Images for the turn indicator
         self.black_turn_image = ImageTk.PhotoImage(Image.open("black_piece.png").resize((50, 50)))
         self.white_turn_image = ImageTk.PhotoImage(Image.open("white_piece.png").resize((50, 50)))
@@ -27,75 +95,147 @@ class GobangGameGUI(tk.Canvas):
         # Initialize the turn label
         self.update_turn_label()
 
-        # Load the training log to simulate the moves
-        self.training_moves = self.load_training_log(log_file)
-        self.current_move_idx = 0  # Start from the first move in the training log
+        # The training log is opened on the first replayed move and read one game at a time
+        # by the AI worker; the replay position is only changed on the Tk thread
+        self.log_file = log_file
+        self.training_log = None
+        self.replay_cache = (None, None)  # (game, decoded moves) last read from the log
+        self.replay_episode = 0  # Game of the training log being replayed
+        self.current_move_idx = 0  # Next move to replay within that game
 
         self.draw_board()
 
-    def load_training_log(self, log_file):
-        """Load the training log from file."""
-        moves = []
-        try:
-            with open(log_file, 'r') as f:
-                lines = f.readlines()
-                for line in lines:
-                    # Try to extract episode, player, and move from the line
-                    parts = line.strip().split(' - ')
-                    if len(parts) == 2:
-                        # Extract player and move information
-                        episode_info = parts[1].split(' Move: ')
-                        if len(episode_info) == 2:
-                            player = episode_info[0].strip()
-                            move = episode_info[1].strip()
-                            moves.append((player, move))
-                    else:
-                        print(f"Skipping invalid line: {line}")
-        except Exception as e:
-            print(f"Error loading training log: {e}")
-        return moves
+    def jump_to_episode(self, episode):
+        """Continue the training log replay from the start of game `episode` (0-based)."""
+        self.replay_episode = episode
+        self.current_move_idx = 0
+
+    def next_training_move(self, episode, idx):
+        """Return (episode, idx, (player, x, y)) of the first logged move at or after move `idx` of game `episode`.
+
+        Returns None when the training log is used up. Does not move the replay position.
+        """
+        if self.training_log is None:
+            self.training_log = open_training_log(self.log_file)
+            if self.training_log is None:
+                print(f"Training log not found: {self.log_file}")
+                return None
+        while episode < len(self.training_log):
+            if self.replay_cache[0] != episode:
+                self.replay_cache = (episode, self.training_log.episode_moves(episode))
+            moves = self.replay_cache[1]
+            if idx < len(moves):
+                return episode, idx, moves[idx]
+            episode, idx = episode + 1, 0
+        return None
 
     def agent_move(self):
-        """AI makes a move based on the current game state."""
-        if self.mode_var.get() == "Easy AI":
-            self.random_ai_move()  # Easy AI: Random move
-        elif self.mode_var.get() == "Hard AI":
-            self.hard_ai_move()
+        """Start computing the AI move on a background thread.
+
+        The move is chosen on a copy of the game, so the Tk event loop keeps
+        handling input and repaints; poll_ai_move() plays it once it is ready.
+        A cancelled worker may still be finishing its last search batch; it is
+        waited for first, since all workers share one MCTS.
+        """
+        if self.ai_thread is not None:
+            self.ai_thread.join()
+        self.ai_request += 1
+        self.ai_cancel = threading.Event()
+        deadline = time.monotonic() + self.think_time
+        self.set_thinking(True)
+        replay_from = (self.replay_episode, self.current_move_idx)
+        self.ai_thread = threading.Thread(target=self.compute_ai_move,
+                                          args=(self.ai_request, self.mode_var.get(), self.game.copy(),
+                                                self.threats.copy(), deadline, self.ai_cancel, replay_from),
+                                          daemon=True)
+        self.ai_thread.start()
+        self.after(self.AI_POLL_MS, self.poll_ai_move)
+
+    def compute_ai_move(self, request, mode, game, threats, deadline, cancel, replay_from):
+        """Worker thread: choose a move and hand it to the Tk thread through the result queue.
+
+        A move is (x, y, player, replay), where replay is the ((episode, idx) the
+        replay started from, (episode, idx) of the move) for moves from the training log.
+        """
+        move = None
+        try:
+            if mode == "Easy AI":
+                move = self.random_ai_move(threats)  # Easy AI: Random move
+            elif mode == "Hard AI":
+                move = self.hard_ai_move(game, deadline, cancel, replay_from)
+        except Exception as e:
+            print(f"Error computing AI move: {e}")
+        self.ai_results.put((request, move))
+
+    def poll_ai_move(self):
+        """Play the AI move once the worker has finished; runs on the Tk thread via after()."""
+        while True:
+            try:
+                request, move = self.ai_results.get_nowait()
+            except queue.Empty:
+                if self.thinking:
+                    self.after(self.AI_POLL_MS, self.poll_ai_move)
+                return
+            if request == self.ai_request:  # Results of cancelled requests are dropped
+                break
+
+        self.set_thinking(False)
+        if move is None:
+            return
+        if self.search is not None and self.mode_var.get() == "Hard AI" and self.status_label is not None:
+            stats = self.search.last_stats
+            self.status_label.config(
+                text=f"{stats['simulations']} simulations ({stats['simulations_per_sec']:.0f}/s)")
+        x, y, player, replay = move
+        if not self.play_move(x, y, player):  # Make the AI's move
+            return
+        if replay is not None and replay[0] == (self.replay_episode, self.current_move_idx):
+            # Move to the next step in the log, unless the replay position changed meanwhile
+            self.replay_episode, self.current_move_idx = replay[1][0], replay[1][1] + 1
 
         # Check if there's a winner based on the current board state
         winner = self.game.check_winner()
         if winner:
             self.announce_winner(winner)
 
-    def random_ai_move(self):
-        """Make a random move for the AI."""
-        valid_moves = [(i, j) for i in range(self.board_size) for j in range(self.board_size) if
-                       self.game.is_valid_move(i, j)]
-        if valid_moves:
-            x, y = random.choice(valid_moves)
-            self.move_history.append((x, y, self.game.current_player))  # Log the AI's move
-            self.game.step((x, y))  # Make the AI's move
-            self.log_move(x, y, 'White')  # Log the move
-            self.draw_board()  # Redraw the board after the move
-
-    def hard_ai_move(self):
-        """Make a move based on the training log (AI move from the log)."""
-        if self.current_move_idx < len(self.training_moves):
-            player, move = self.training_moves[self.current_move_idx]
-            move_x = ord(move[0]) - 65  # Convert column letter to index (A->0, B->1, C->2, ...)
-            move_y = int(move[1:]) - 1  # Convert row number to index (1->0, 2->1, 3->2, ...)
-
-            if self.game.is_valid_move(move_x, move_y):
-                self.move_history.append(
-                    (move_x, move_y, self.game.current_player))  # Log the AI's move
-                self.game.step((move_x, move_y))  # Make the AI's move
-                self.log_move(move_x, move_y, player)  # Log the move in the move log
-                self.draw_board()  # Redraw the board after the move
-
-                # Move to the next step in the log
-                self.current_move_idx += 1
-            else:
-                print(f"Invalid move in log: {move} at index {self.current_move_idx}")
+    def cancel_ai_move(self):
+        """Stop waiting for the AI move; the human may then play the AI's turn."""
+        if self.thinking:
+            self.ai_cancel.set()
+            self.ai_request += 1
+            self.set_thinking(False)
+
+    def set_thinking(self, thinking):
+        """Show or hide the "thinking" indicator."""
+        self.thinking = thinking
+        if self.status_label is not None:
+            self.status_label.config(text="AI thinking..." if thinking else "")
+
+    def random_ai_move(self, threats):
+        """Choose a random move for the AI among the candidate moves near the stones."""
+        xs, ys = threats.candidate_mask().nonzero()
+        if len(xs):
+            i = random.randrange(len(xs))
+            return int(xs[i]), int(ys[i]), 'White', None
+        return None
+
+    def hard_ai_move(self, game, deadline, cancel, replay_from):
+        """Choose a move by tree search with the trained agent, or replay the training log if no model is loaded."""
+        if self.search is not None:
+            x, y = self.search.best_move(game, time_budget=max(deadline - time.monotonic(), 0.0), cancel=cancel)
+            return x, y, 'White', None
+        return self.replay_ai_move(game, replay_from)
+
+    def replay_ai_move(self, game, replay_from):
+        """Choose a move based on the training log (AI move from the log), starting at position `replay_from`."""
+        found = self.next_training_move(*replay_from)
+        if found is not None:
+            episode, idx, (player, move_y, move_x) = found  # The GUI's first index is the column letter, the log's second
+
+            if game.is_valid_move(move_x, move_y):
+                return move_x, move_y, player, (replay_from, (episode, idx))
+            print(f"Invalid move in log: {chr(move_x + 65)}{move_y + 1} at index {idx}")
+        return None
 
     def update_turn_label(self):
         """Update the turn label based on the current player."""
@@ -104,51 +244,81 @@ class GobangGameGUI(tk.Canvas):
         else:  # Player 2 (White)
             self.turn_label.config(image=self.white_turn_image)
 
-    def draw_board(self):
-        """Draw the board grid and alphanumeric labels."""
-        self.delete("all")
-
+    def draw_grid(self):
+        """Draw the board grid and alphanumeric labels once; they never change during a game."""
         # Draw grid lines
         for i in range(self.board_size):
             x = self.OFFSET + i * self.CELL_WIDTH
             y = self.OFFSET + i * self.CELL_WIDTH
             self.create_line(x, self.OFFSET, x,
-                             self.OFFSET + (self.board_size - 1) * self.CELL_WIDTH)
+                             self.OFFSET + (self.board_size - 1) * self.CELL_WIDTH, tags='grid')
             self.create_line(self.OFFSET, y, self.OFFSET + (self.board_size - 1) * self.CELL_WIDTH,
-                             y)
+                             y, tags='grid')
 
         # Draw alphanumeric labels
         for i in range(self.board_size):
             # Column labels (A, B, C, ...)
             letter = chr(65 + i)  # Convert to ASCII: 65 = 'A'
             x = self.OFFSET + i * self.CELL_WIDTH
-            self.create_text(x, self.OFFSET - 15, text=letter, font=("Arial", 12, "bold"))
+            self.create_text(x, self.OFFSET - 15, text=letter, font=("Arial", 12, "bold"), tags='grid')
 
             # Row labels (1, 2, 3, ...)
             number = str(i + 1)
             y = self.OFFSET + i * self.CELL_WIDTH
-            self.create_text(self.OFFSET - 15, y, text=number, font=("Arial", 12, "bold"))
+            self.create_text(self.OFFSET - 15, y, text=number, font=("Arial", 12, "bold"), tags='grid')
 
-        # Draw pieces on the board
-        for row in range(self.board_size):
-            for col in range(self.board_size):
-                if self.game.board[row][col] == 1:
-                    self.draw_piece(row, col, 'black')
-                elif self.game.board[row][col] == 2:
-                    self.draw_piece(row, col, 'white')
-
-        # Update the turn label
-        self.update_turn_label()
+    def draw_board(self):
+        """Redraw all stones from the game board, e.g. after a reset."""
+        with self.render_timer.measure('board'):
+            self.delete('stone')
+            self.threats.sync(self.game.board)
+            self.itemconfig(self.preview, state='hidden')
+            self.preview_cell = None
+
+            # Draw pieces on the board
+            for row in range(self.board_size):
+                for col in range(self.board_size):
+                    if self.game.board[row][col] == 1:
+                        self.draw_piece(row, col, 'black')
+                    elif self.game.board[row][col] == 2:
+                        self.draw_piece(row, col, 'white')
+
+            # Update the turn label
+            self.update_turn_label()
 
     def draw_piece(self, row, col, color):
         """Draw a piece at the given grid location."""
         x = self.OFFSET + row * self.CELL_WIDTH
         y = self.OFFSET + col * self.CELL_WIDTH
         radius = self.CELL_WIDTH // 2 - 2
-        self.create_oval(x - radius, y - radius, x + radius, y + radius, fill=color)
+        self.create_oval(x - radius, y - radius, x + radius, y + radius, fill=color, tags='stone')
+
+    def play_move(self, x, y, player):
+        """Play a move on the game board and add only its stone to the canvas.
+
+        Returns False, changing nothing, if the cell is already taken.
+        """
+        with self.render_timer.measure('move'):
+            current = self.game.current_player
+            board, _ = self.game.step((x, y))  # Make the move on the game board
+            if board is None:
+                print(f"Invalid move: {chr(65 + x)}{y + 1} is already taken")
+                return False
+            color = 'black' if current == 1 else 'white'
+            self.move_history.append((x, y, current))  # Log the move
+            self.threats.place(x, y, current)
+            self.draw_piece(x, y, color)
+            if self.preview_cell == (x, y):
+                self.itemconfig(self.preview, state='hidden')
+                self.preview_cell = None
+            self.log_move(x, y, player)  # Log the move in the move log
+        return True
 
     def on_click(self, event):
         """Handle user clicks to place a piece."""
+        if self.thinking:
+            return  # Wait for the AI move (or cancel it) before playing on
+
         tolerance = 0.3  # 30% of CELL_WIDTH as the tolerance
 
         x = (event.x - self.OFFSET) // self.CELL_WIDTH
@@ -158,10 +328,7 @@ class GobangGameGUI(tk.Canvas):
         snapped_y = round((event.y - self.OFFSET) / self.CELL_WIDTH)
 
         if self.game.is_valid_move(snapped_x, snapped_y):
-            self.move_history.append((snapped_x, snapped_y, self.game.current_player))  # Log the player's move
-            self.game.step((snapped_x, snapped_y))  # Make the move on the game board
-            self.log_move(snapped_x, snapped_y, 'Black' if self.game.current_player == 2 else 'White')  # Log move in the move log
-            self.draw_board()  # Redraw the board after the move
+            self.play_move(snapped_x, snapped_y, 'Black' if self.game.current_player == 1 else 'White')
 
             # Check for a winner after the player's move
             winner = self.game.check_winner()
@@ -190,29 +357,23 @@ class GobangGameGUI(tk.Canvas):
 
     def on_mouse_move(self, event):
         """Track the mouse position and show a piece contour during movement."""
-        x = (event.x - self.OFFSET) // self.CELL_WIDTH
-        y = (event.y - self.OFFSET) // self.CELL_WIDTH
+        with self.render_timer.measure('motion'):
+            # Calculate the position to "snap" to the grid (ensure it's aligned with the grid intersections)
+            snapped_x = round((event.x - self.OFFSET) / self.CELL_WIDTH)
+            snapped_y = round((event.y - self.OFFSET) / self.CELL_WIDTH)
 
-        # Calculate the position to "snap" to the grid (ensure it's aligned with the grid intersections)
-        snapped_x = round((event.x - self.OFFSET) / self.CELL_WIDTH)
-        snapped_y = round((event.y - self.OFFSET) / self.CELL_WIDTH)
-
-        # If the position is valid, show a preview of the piece contour
-        if self.game.is_valid_move(snapped_x, snapped_y):
-            self.preview_x = snapped_x
-            self.preview_y = snapped_y
-            self.draw_board()  # Redraw the board to remove the old preview
-            self.draw_preview_piece(self.preview_x, self.preview_y)  # Draw the piece contour
+            # If the position is valid, move the preview of the piece contour there
+            if (snapped_x, snapped_y) != self.preview_cell and self.game.is_valid_move(snapped_x, snapped_y):
+                self.draw_preview_piece(snapped_x, snapped_y)
 
     def draw_preview_piece(self, x, y):
-        """Draw the contour of the piece at the mouse position, making sure the mouse is centered on it."""
+        """Move the contour of the piece to the mouse position, making sure the mouse is centered on it."""
         color = 'black' if self.game.current_player == 1 else 'white'
         radius = self.CELL_WIDTH // 2 - 2
         # Calculate the position for the contour so that it snaps to the grid intersection
         x_pos = self.OFFSET + x * self.CELL_WIDTH
         y_pos = self.OFFSET + y * self.CELL_WIDTH
-        self.create_oval(x_pos - radius, y_pos - radius, x_pos + radius, y_pos + radius,
-                         outline=color, width=2)
-
-
-
+        self.coords(self.preview, x_pos - radius, y_pos - radius, x_pos + radius, y_pos + radius)
+        self.itemconfig(self.preview, outline=color, state='normal')
+        self.tag_raise(self.preview)
+        self.preview_cell = (x, y)
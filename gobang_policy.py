@@ -0,0 +1,32 @@
+import numpy as np
+import torch
+
+
+def board_to_tensor(board, device='cpu'):
+    """Turn a (board_size, board_size) board into network input of shape (1, 1, n, n)."""
+    return torch.as_tensor(np.asarray(board), dtype=torch.float32, device=device).unsqueeze(0).unsqueeze(0)
+
+
+def legal_move_mask(board, device='cpu'):
+    """Boolean mask of shape (1, n * n) that is True for the empty cells of `board`."""
+    return torch.as_tensor(np.asarray(board).reshape(1, -1) == 0, device=device)
+
+
+def mask_logits(action_logits, legal_mask):
+    """Set the logits of illegal moves to -inf so softmax gives them zero probability."""
+    return action_logits.masked_fill(~legal_mask, float('-inf'))
+
+
+def select_action(agent, state_tensor, legal_mask, greedy=False):
+    """Choose a legal move for every state in the batch with one forward pass.
+
+    Returns (actions, masked_logits), where actions are flat cell indices
+    (x * board_size + y). With greedy=True the most likely legal move is taken
+    instead of sampling from the policy.
+    """
+    masked_logits = mask_logits(agent(state_tensor), legal_mask)
+    if greedy:
+        actions = masked_logits.argmax(dim=-1)
+    else:
+        actions = torch.distributions.Categorical(logits=masked_logits).sample()
+    return actions, masked_logits
@@ -0,0 +1,225 @@
+import argparse
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+import numpy as np
+import torch
+
+LOCALHOST = '127.0.0.1'
+DEFAULT_PORT = 50007
+AUTHKEY = b'gobang'
+
+
+def to_tensors(result, device):
+    """Turn a server result (logits, or a (logits, values) pair) into tensors on `device`."""
+    if isinstance(result, tuple):
+        return tuple(torch.from_numpy(array).to(device) for array in result)
+    return torch.from_numpy(result).to(device)
+
+
+class InferenceServer:
+    """Batches position requests from many games into shared forward passes.
+
+    Games call `submit` (or use the server itself like an agent) from any
+    thread. A worker thread takes the first pending request, keeps collecting
+    requests for up to `max_latency_ms` or until `max_batch_size` boards are
+    waiting, and runs them through the model as one batch. Every request gets
+    its own Future holding the outputs for its boards: the logits, or
+    (logits, values) when the model also has a value head.
+    """
+
+    def __init__(self, model, board_size, device='cpu', max_batch_size=64, max_latency_ms=2.0):
+        self.model = model
+        self.board_size = board_size
+        self.device = torch.device(device)
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.requests = queue.Queue()
+        self.worker = None
+        self.stop_event = threading.Event()
+        self.listener = None
+        self.port = None
+        # Metrics
+        self.num_requests = 0
+        self.num_batches = 0
+        self.num_boards = 0
+        self.max_batch_seen = 0
+        self.queue_latencies = deque(maxlen=1000)  # Seconds from submit to the start of the forward pass
+        self.forward_times = deque(maxlen=1000)
+
+    def start(self):
+        if self.worker is None:
+            self.stop_event.clear()
+            self.worker = threading.Thread(target=self._run, daemon=True)
+            self.worker.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def submit(self, boards):
+        """Queue a (board_size, board_size) board or a (k, board_size, board_size) stack.
+
+        Returns a Future resolving to the logits as a (k, board_size ** 2) array,
+        or to a (logits, values) pair of arrays if the model returns one.
+        """
+        boards = np.asarray(boards, dtype=np.float32)
+        if boards.ndim == 2:
+            boards = boards[None]
+        if boards.shape[1:] != (self.board_size, self.board_size):
+            raise ValueError(f"Expected {self.board_size}x{self.board_size} boards, got shape {boards.shape}")
+        future = Future()
+        self.requests.put((boards, future, time.perf_counter()))
+        return future
+
+    def __call__(self, states):
+        """Agent-style forward of a (B, 1, n, n) tensor, so MCTS can search through the server."""
+        result = self.submit(states.reshape(-1, self.board_size, self.board_size).cpu().numpy()).result()
+        return to_tensors(result, states.device)
+
+    def _collect(self):
+        """Block for one request, then gather more until the batch is full or the latency window ends."""
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        rows = len(batch[0][0])
+        deadline = batch[0][2] + self.max_latency
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self.requests.get(timeout=remaining) if remaining > 0 else self.requests.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            rows += len(request[0])
+        return batch
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                states = torch.from_numpy(np.concatenate([boards for boards, _, _ in batch])).unsqueeze(1)
+                with torch.inference_mode():
+                    output = self.model(states.to(self.device))
+                if isinstance(output, tuple):
+                    logits, values = (tensor.float().cpu().numpy() for tensor in output[:2])
+                else:
+                    logits, values = output.float().cpu().numpy(), None
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for boards, future, submitted in batch:
+                rows = slice(offset, offset + len(boards))
+                future.set_result(logits[rows] if values is None else (logits[rows], values[rows]))
+                offset += len(boards)
+                self.queue_latencies.append(start - submitted)
+            self.forward_times.append(time.perf_counter() - start)
+            self.num_requests += len(batch)
+            self.num_batches += 1
+            self.num_boards += len(logits)
+            self.max_batch_seen = max(self.max_batch_seen, len(logits))
+
+    def stats(self):
+        """Batch size and queue latency metrics (latencies in milliseconds, over recent batches)."""
+        latencies = np.asarray(self.queue_latencies) * 1000
+        forwards = np.asarray(self.forward_times) * 1000
+        return {'requests': self.num_requests, 'batches': self.num_batches, 'boards': self.num_boards,
+                'mean_batch_size': self.num_boards / self.num_batches if self.num_batches else 0.0,
+                'max_batch_size': self.max_batch_seen,
+                'queue_latency_mean_ms': float(latencies.mean()) if len(latencies) else 0.0,
+                'queue_latency_p95_ms': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+                'forward_mean_ms': float(forwards.mean()) if len(forwards) else 0.0,
+                'pending': self.requests.qsize()}
+
+    def serve(self, port=DEFAULT_PORT, authkey=AUTHKEY):
+        """Accept InferenceClient connections on localhost until `stop` is called (blocks)."""
+        self.start()
+        self.listener = Listener((LOCALHOST, port), authkey=authkey)
+        self.port = self.listener.address[1]  # The port actually bound when `port` is 0
+        while not self.stop_event.is_set():
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break  # Listener closed by stop()
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        """Answer one client's requests; a request of None asks for the metrics."""
+        with conn:
+            while True:
+                try:
+                    boards = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(self.stats() if boards is None else self.submit(boards).result())
+                except Exception as e:
+                    conn.send(e)
+
+
+class InferenceClient:
+    """Agent-style handle on an InferenceServer running in another process on this machine."""
+
+    def __init__(self, port=DEFAULT_PORT, authkey=AUTHKEY):
+        self.conn = Client((LOCALHOST, port), authkey=authkey)
+        self.device = torch.device('cpu')
+        self.lock = threading.Lock()  # One request in flight per connection
+
+    def _request(self, message):
+        with self.lock:
+            self.conn.send(message)
+            reply = self.conn.recv()
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def __call__(self, states):
+        boards = states.reshape(len(states), states.shape[-2], states.shape[-1]).to(torch.int8).cpu().numpy()
+        return to_tensors(self._request(boards), states.device)
+
+    def stats(self):
+        return self._request(None)
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    from model_cache import ModelCache, model_path
+
+    parser = argparse.ArgumentParser(description="Serve a trained model to local games over one shared batch queue.")
+    parser.add_argument("--board-size", type=int, default=15)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = ModelCache(device=device).get(args.board_size, model_path(args.board_size))
+    server = InferenceServer(model, args.board_size, device, args.max_batch_size, args.max_latency_ms)
+    print(f"Serving {model_path(args.board_size)} on {LOCALHOST}:{args.port}")
+    try:
+        server.serve(args.port)
+    except KeyboardInterrupt:
+        server.stop()
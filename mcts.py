@@ -0,0 +1,290 @@
+import math
+import time
+import numpy as np
+import torch
+from gobang_policy import mask_logits
+from symmetry import canonical_key, inverse, transform
+from threat_eval import ThreatEvaluator
+from transposition import TTEntry
+
+
+class NodeStore:
+    """Array-backed storage for the search tree.
+
+    Node i is described by entry i of every array. The children of a node are
+    stored next to each other, starting at first_child[i], so expanding a
+    node is one slice assignment and selecting a child is one vectorized
+    scoring of that slice. Arrays double in size when they run out of room.
+    """
+
+    def __init__(self, capacity=4096):
+        self.parent = np.zeros(capacity, dtype=np.int32)
+        self.action = np.zeros(capacity, dtype=np.int32)
+        self.prior = np.zeros(capacity, dtype=np.float32)
+        self.visits = np.zeros(capacity, dtype=np.float32)
+        self.value_sum = np.zeros(capacity, dtype=np.float32)  # From the view of the player who moved into the node
+        self.virtual_loss = np.zeros(capacity, dtype=np.float32)
+        self.first_child = np.zeros(capacity, dtype=np.int32)
+        self.num_children = np.zeros(capacity, dtype=np.int32)
+        self.terminal = np.zeros(capacity, dtype=np.int8)  # 1 once the move into the node is known to end the game
+        self.terminal_value = np.zeros(capacity, dtype=np.float32)
+        self.size = 0
+
+    def clear(self):
+        self.size = 0
+
+    def _grow(self, needed):
+        capacity = len(self.parent)
+        while capacity < needed:
+            capacity *= 2
+        for name in ('parent', 'action', 'prior', 'visits', 'value_sum', 'virtual_loss',
+                     'first_child', 'num_children', 'terminal', 'terminal_value'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, parent, actions, priors):
+        """Append one child per action and return the index of the first one."""
+        start, count = self.size, len(actions)
+        if start + count > len(self.parent):
+            self._grow(start + count)
+        end = start + count
+        self.parent[start:end] = parent
+        self.action[start:end] = actions
+        self.prior[start:end] = priors
+        self.visits[start:end] = 0
+        self.value_sum[start:end] = 0
+        self.virtual_loss[start:end] = 0
+        self.num_children[start:end] = 0
+        self.terminal[start:end] = 0
+        self.size = end
+        return start
+
+
+class MCTS:
+    """Monte Carlo tree search player guided by the agent's policy head.
+
+    Leaves reached by different simulations are evaluated together: up to
+    `batch_size` simulations descend the tree with a virtual loss on their
+    path, so they spread over different leaves, and all their leaves go
+    through the network in one forward pass. If the agent returns a
+    (logits, value) pair the value is used for non-terminal leaves, otherwise
+    they count as even and only finished games score.
+
+    An optional TranspositionTable, keyed by the games' Zobrist hash, caches
+    network outputs and root search values across simulations and searches,
+    so a position reached through another move order skips the network.
+    With canonical=True positions are keyed by their canonical orientation
+    instead, so the 8 rotations and reflections of a board share one entry.
+
+    With use_threats=True a ThreatEvaluator follows the search and nodes only
+    get children for the candidate moves near existing stones, or only the
+    immediate wins / forced blocks when there are any.
+    """
+
+    def __init__(self, agent, board_size, device='cpu', num_simulations=200, time_budget=None,
+                 batch_size=16, c_puct=1.5, virtual_loss=1.0, table=None, use_threats=False,
+                 canonical=False):
+        self.agent = agent
+        self.board_size = board_size
+        self.device = device
+        self.num_simulations = num_simulations
+        self.time_budget = time_budget
+        self.batch_size = batch_size
+        self.c_puct = c_puct
+        self.virtual_loss = virtual_loss
+        self.table = table
+        self.use_threats = use_threats
+        self.canonical = canonical
+        self.nodes = NodeStore()
+        self.last_stats = {}
+        self.last_priors = None  # Root priors over all cells (0 for cells without a child) of the last search
+
+    def evaluate(self, boards):
+        """Priors over all cells and values (for the player to move) of a batch of boards."""
+        states = torch.as_tensor(np.stack(boards), dtype=torch.float32, device=self.device).unsqueeze(1)
+        masks = states.flatten(1) == 0
+        with torch.inference_mode():
+            output = self.agent(states)
+        logits, values = output if isinstance(output, tuple) else (output, None)
+        priors = torch.softmax(mask_logits(logits, masks), dim=-1).cpu().numpy()
+        values = np.zeros(len(boards)) if values is None else values.flatten().cpu().numpy()
+        return priors, values
+
+    def table_key(self, game):
+        """Table key of the position of `game` and the transform from the board to the keyed orientation."""
+        if self.canonical:
+            return canonical_key(game.board)
+        return game.hash, 0
+
+    def orient(self, priors, k):
+        """Apply board transform `k` to a flat vector of per-cell priors."""
+        if k == 0:
+            return priors
+        n = self.board_size
+        return np.ascontiguousarray(transform(priors.reshape(n, n), k)).reshape(-1)
+
+    def legal_moves(self, game, threats):
+        """Flat indices of the moves a node of `game` gets children for."""
+        if threats is None:
+            return np.flatnonzero(np.asarray(game.board).reshape(-1) == 0)
+        forced = threats.forced_moves(game.current_player)
+        if forced:
+            return np.array([x * self.board_size + y for x, y in forced])
+        return np.flatnonzero(threats.candidate_mask().reshape(-1))
+
+    def expand(self, node, legal, priors):
+        priors = priors[legal]
+        total = priors.sum()
+        priors = priors / total if total > 0 else np.full(len(legal), 1.0 / len(legal))
+        self.nodes.first_child[node] = self.nodes.add(node, legal, priors)
+        self.nodes.num_children[node] = len(legal)
+
+    def select_child(self, node):
+        nodes = self.nodes
+        start = nodes.first_child[node]
+        end = start + nodes.num_children[node]
+        visits = nodes.visits[start:end] + nodes.virtual_loss[start:end]
+        # Virtual losses count as lost visits, steering parallel simulations apart
+        q = np.where(visits > 0, (nodes.value_sum[start:end] - nodes.virtual_loss[start:end]) /
+                     np.maximum(visits, 1), 0.0)
+        parent_visits = nodes.visits[node] + nodes.virtual_loss[node]
+        u = self.c_puct * nodes.prior[start:end] * math.sqrt(max(parent_visits, 1)) / (1 + visits)
+        return start + int(np.argmax(q + u))
+
+    def backup(self, path, value):
+        """Propagate `value`, seen from the player to move at the leaf, and remove virtual losses."""
+        nodes = self.nodes
+        for node in reversed(path):
+            value = -value  # Stored from the view of the player who moved into the node
+            nodes.visits[node] += 1
+            nodes.value_sum[node] += value
+            nodes.virtual_loss[node] -= self.virtual_loss
+
+    def search(self, game, num_simulations=None, time_budget=None, cancel=None):
+        """Search from the position of `game` and return the root visit count of every cell.
+
+        The search stops after `num_simulations` simulations or `time_budget`
+        seconds, whichever comes first, or when the `cancel` event is set.
+        `game` is left unchanged.
+        """
+        num_simulations = num_simulations or self.num_simulations
+        time_budget = time_budget if time_budget is not None else self.time_budget
+        if num_simulations is None and time_budget is None:
+            raise ValueError("MCTS needs a simulation count or a time budget")
+        start_time = time.perf_counter()
+        deadline = None if time_budget is None else start_time + time_budget
+        if game.is_full() or game.check_winner():
+            raise ValueError("Cannot search a finished game")
+        game = game.copy()
+        threats = ThreatEvaluator.from_board(game.board) if self.use_threats else None
+        nodes = self.nodes
+        nodes.clear()
+        root = nodes.add(-1, [-1], [1.0])
+        root_key, root_k = self.table_key(game) if self.table is not None else (None, 0)
+        root_entry = self.table.get(root_key) if self.table is not None else None
+        evaluations = 0  # Boards that went through the network
+        if root_entry is None:
+            priors, values = self.evaluate([game.board])
+            evaluations += 1
+            root_entry = TTEntry(self.orient(priors[0], root_k), float(values[0]))
+        self.expand(root, self.legal_moves(game, threats), self.orient(root_entry.priors, inverse(root_k)))
+        simulations, batches, table_hits = 0, 0, 0
+
+        while (num_simulations is None or simulations < num_simulations) and \
+                (deadline is None or time.perf_counter() < deadline) and \
+                not (cancel is not None and cancel.is_set()):
+            pending, pending_leaves, boards, keys, legals = [], set(), [], [], []
+            room = self.batch_size if num_simulations is None else min(self.batch_size, num_simulations - simulations)
+            for _ in range(room):
+                node, path, moves = root, [root], 0
+                nodes.virtual_loss[root] += self.virtual_loss
+                while nodes.num_children[node] > 0:
+                    node = self.select_child(node)
+                    path.append(node)
+                    nodes.virtual_loss[node] += self.virtual_loss
+                    if nodes.terminal[node]:
+                        break
+                    x, y = divmod(int(nodes.action[node]), self.board_size)
+                    if threats is not None:
+                        threats.place(x, y, game.current_player)
+                    _, done = game.step((x, y))
+                    moves += 1
+                    if done or game.is_full():
+                        nodes.terminal[node] = 1
+                        nodes.terminal_value[node] = 1.0 if done else 0.0
+                        break
+
+                collided = False
+                if nodes.terminal[node]:
+                    # Finished games need no network call: the player who moved into the node won (or drew)
+                    self.backup(path, -nodes.terminal_value[node])
+                    simulations += 1
+                elif node in pending_leaves:
+                    # Another simulation of this batch already waits on this leaf: evaluate what we have
+                    for visited in path:
+                        nodes.virtual_loss[visited] -= self.virtual_loss
+                    collided = True
+                else:
+                    key, k = self.table_key(game) if self.table is not None else (None, 0)
+                    entry = self.table.get(key) if self.table is not None else None
+                    if entry is not None:
+                        # Position seen before (possibly via another move order): no network call
+                        self.expand(node, self.legal_moves(game, threats), self.orient(entry.priors, inverse(k)))
+                        self.backup(path, entry.value if entry.search_value is None else entry.search_value)
+                        simulations += 1
+                        table_hits += 1
+                    else:
+                        pending.append(path)
+                        pending_leaves.add(node)
+                        boards.append(game.board.copy())
+                        keys.append((key, k))
+                        legals.append(self.legal_moves(game, threats))
+                for _ in range(moves):
+                    if threats is not None:
+                        threats.remove(*game.last_move)
+                    game.undo()
+                if collided:
+                    break
+
+            if pending:
+                priors, values = self.evaluate(boards)
+                batches += 1
+                evaluations += len(boards)
+                for path, legal, (key, k), leaf_priors, value in zip(pending, legals, keys, priors, values):
+                    self.expand(path[-1], legal, leaf_priors)
+                    self.backup(path, value)
+                    if self.table is not None:
+                        self.table.put(key, TTEntry(self.orient(leaf_priors, k), float(value)))
+                simulations += len(pending)
+
+        if self.table is not None and nodes.visits[root] > 0:
+            # The root value is stored for the player who moved into it; flip it for the player to move
+            root_entry.search_value = -float(nodes.value_sum[root] / nodes.visits[root])
+            root_entry.depth = max(root_entry.depth, simulations)
+            self.table.put(root_key, root_entry)
+
+        elapsed = time.perf_counter() - start_time
+        self.last_stats = {'simulations': simulations, 'batches': batches, 'nodes': nodes.size,
+                           'table_hits': table_hits, 'evaluations': evaluations, 'seconds': elapsed,
+                           'simulations_per_sec': simulations / max(elapsed, 1e-9)}
+
+        visits = np.zeros(self.board_size * self.board_size, dtype=np.float32)
+        start = nodes.first_child[root]
+        end = start + nodes.num_children[root]
+        visits[nodes.action[start:end]] = nodes.visits[start:end]
+        self.last_priors = np.zeros_like(visits)
+        self.last_priors[nodes.action[start:end]] = nodes.prior[start:end]
+        return visits
+
+    def best_move(self, game, num_simulations=None, time_budget=None, cancel=None):
+        """Return the most visited move (x, y) from the position of `game`.
+
+        If no simulation finished (budget spent on the root evaluation, or
+        cancelled right away) the legal move with the highest prior is returned.
+        """
+        visits = self.search(game, num_simulations, time_budget, cancel)
+        if not visits.any():
+            visits = self.last_priors
+        return divmod(int(np.argmax(visits)), self.board_size)
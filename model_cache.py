@@ -0,0 +1,164 @@
+import argparse
+import copy
+import os
+import time
+from collections import OrderedDict
+import torch
+import torch.nn as nn
+from conv_policy import from_checkpoint, is_conv_checkpoint
+
+# Exported variants of models/NxN/model.pth, saved next to it as TorchScript archives
+EXPORT_FILES = {'script': 'model.script.pt', 'quantized': 'model.int8.pt'}
+
+
+def model_path(board_size, model_dir='models'):
+    return os.path.join(model_dir, f"{board_size}x{board_size}", "model.pth")
+
+
+def export_path(checkpoint_path, kind):
+    return os.path.join(os.path.dirname(checkpoint_path), EXPORT_FILES[kind])
+
+
+class InferenceModel:
+    """Inference-only wrapper around an agent: eval mode, forward under torch.inference_mode.
+
+    `kind` says what is wrapped: the eager GobangAgent, a TorchScript export or
+    a dynamically int8-quantized TorchScript export.
+    """
+
+    def __init__(self, model, device, kind='eager'):
+        self.model = model.eval()
+        self.device = torch.device(device)
+        self.kind = kind
+
+    def __call__(self, states):
+        with torch.inference_mode():
+            return self.model(states)
+
+    def parameters(self):
+        return self.model.parameters()
+
+
+def build_agent(board_size, checkpoint_path, device='cpu'):
+    """The agent saved at `checkpoint_path`, in eval mode.
+
+    Size-agnostic ConvPolicyNet checkpoints are rebuilt from their saved
+    architecture; plain state dicts are loaded into a GobangAgent, ignoring
+    mismatched layers.
+    """
+    checkpoint = torch.load(checkpoint_path, map_location=device)
+    if is_conv_checkpoint(checkpoint):
+        return from_checkpoint(checkpoint, device).eval()
+    from gobang_agent import GobangAgent
+    agent = GobangAgent(board_size=board_size).to(device)
+    agent.load_state_dict(checkpoint, strict=False)
+    return agent.eval()
+
+
+def export_model(agent, board_size, checkpoint_path, kind='quantized'):
+    """Save a TorchScript (kind='script') or dynamic int8 quantized (kind='quantized') export.
+
+    The export goes next to `checkpoint_path` and runs on the CPU. `agent` itself
+    is left on its device and in its mode. Returns its path.
+    """
+    agent = copy.deepcopy(agent).cpu().eval()
+    if kind == 'quantized':
+        agent = torch.ao.quantization.quantize_dynamic(agent, {nn.Linear}, dtype=torch.qint8)
+    example = torch.zeros(1, 1, board_size, board_size)
+    with torch.inference_mode():
+        try:
+            scripted = torch.jit.script(agent)
+        except Exception:
+            scripted = torch.jit.trace(agent, example)  # Agents with Python-only code paths can still be traced
+    path = export_path(checkpoint_path, kind)
+    scripted.save(path)
+    return path
+
+
+def load_inference_model(board_size, checkpoint_path, device='cpu', prefer=('quantized', 'script')):
+    """Load the fastest available model for `checkpoint_path`.
+
+    On the CPU an export listed in `prefer` is used if it exists and is not
+    older than the checkpoint; otherwise the checkpoint is loaded into a
+    GobangAgent. Raises FileNotFoundError if the checkpoint does not exist.
+    """
+    checkpoint_time = os.path.getmtime(checkpoint_path)
+    if torch.device(device).type == 'cpu':
+        for kind in prefer:
+            path = export_path(checkpoint_path, kind)
+            if os.path.exists(path) and os.path.getmtime(path) >= checkpoint_time:
+                return InferenceModel(torch.jit.load(path, map_location='cpu'), 'cpu', kind)
+    return InferenceModel(build_agent(board_size, checkpoint_path, device), device)
+
+
+class ModelCache:
+    """Loaded inference models keyed by board size, least recently used evicted first.
+
+    A cached model is reused until its checkpoint changes on disk, so switching
+    back to a board size does not read the checkpoint again.
+    """
+
+    def __init__(self, capacity=4, device='cpu'):
+        self.capacity = capacity
+        self.device = device
+        self.models = OrderedDict()  # board_size -> (checkpoint path, mtime, model)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.models)
+
+    def __contains__(self, board_size):
+        return board_size in self.models
+
+    def get(self, board_size, checkpoint_path=None):
+        """The inference model for `board_size`, loading it on a miss.
+
+        Raises FileNotFoundError if the checkpoint does not exist.
+        """
+        checkpoint_path = checkpoint_path or model_path(board_size)
+        mtime = os.path.getmtime(checkpoint_path)
+        cached = self.models.get(board_size)
+        if cached is not None and cached[:2] == (checkpoint_path, mtime):
+            self.hits += 1
+            self.models.move_to_end(board_size)
+            return cached[2]
+        self.misses += 1
+        model = load_inference_model(board_size, checkpoint_path, self.device)
+        self.models[board_size] = (checkpoint_path, mtime, model)
+        self.models.move_to_end(board_size)
+        while len(self.models) > self.capacity:
+            self.models.popitem(last=False)
+        return model
+
+    def evict(self, board_size):
+        self.models.pop(board_size, None)
+
+    def clear(self):
+        self.models.clear()
+
+
+def forward_latency(model, board_size, repeats=200):
+    """Mean milliseconds per single-board forward pass of `model` on the CPU."""
+    states = torch.zeros(1, 1, board_size, board_size)
+    model(states)  # Warm up (TorchScript optimizes on the first calls)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model(states)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export models/NxN/model.pth for fast CPU inference.")
+    parser.add_argument("--board-size", type=int, default=15)
+    parser.add_argument("--kind", choices=sorted(EXPORT_FILES), default='quantized')
+    parser.add_argument("--model-dir", default='models')
+    args = parser.parse_args()
+
+    checkpoint = model_path(args.board_size, args.model_dir)
+    agent = build_agent(args.board_size, checkpoint)
+    path = export_model(agent, args.board_size, checkpoint, args.kind)
+    print(f"Saved {args.kind} export at {path}")
+    eager = forward_latency(InferenceModel(agent, 'cpu'), args.board_size)
+    exported = forward_latency(load_inference_model(args.board_size, checkpoint, prefer=(args.kind,)), args.board_size)
+    print(f"CPU forward latency: eager {eager:.3f} ms, {args.kind} {exported:.3f} ms")
@@ -0,0 +1,151 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+from conv_policy import pad_actions, pad_boards
+from gobang_policy import mask_logits
+from symmetry import NUM_SYMMETRIES, augment_batch
+from telemetry import phase
+
+
+class ReplayBuffer:
+    """Fixed-size ring buffer of (state, action, mask, return) samples.
+
+    Every field lives in a preallocated NumPy array, so adding an episode is a
+    few slice assignments and sampling a minibatch is one fancy-index per field.
+    Once full, the oldest samples are overwritten.
+    """
+
+    def __init__(self, capacity, board_size):
+        self.capacity = capacity
+        self.board_size = board_size
+        self.states = np.zeros((capacity, board_size, board_size), dtype=np.int8)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.masks = np.zeros((capacity, board_size * board_size), dtype=bool)
+        self.returns = np.zeros(capacity, dtype=np.float32)
+        self.position = 0  # Next slot to write
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, mask, ret):
+        """Store a single sample."""
+        self.add_episode([state], [action], [mask], [ret])
+
+    def add_episode(self, states, actions, masks, returns):
+        """Store all samples of one episode, wrapping around when the buffer is full."""
+        count = len(actions)
+        if count == 0:
+            return
+        slots = (self.position + np.arange(count)) % self.capacity
+        self.states[slots] = np.asarray(states).reshape(count, self.board_size, self.board_size)
+        self.actions[slots] = actions
+        self.masks[slots] = np.asarray(masks).reshape(count, -1)
+        self.returns[slots] = returns
+        self.position = (self.position + count) % self.capacity
+        self.size = min(self.size + count, self.capacity)
+
+    def state_dict(self):
+        """Contents of the buffer, for saving with a training checkpoint."""
+        return {'states': self.states[:self.size].copy(), 'actions': self.actions[:self.size].copy(),
+                'masks': self.masks[:self.size].copy(), 'returns': self.returns[:self.size].copy(),
+                'position': self.position}
+
+    def load_state_dict(self, state):
+        size = len(state['actions'])
+        if size > self.capacity:
+            raise ValueError(f"Saved buffer holds {size} samples, more than the capacity {self.capacity}")
+        for name in ('states', 'actions', 'masks', 'returns'):
+            getattr(self, name)[:size] = state[name]
+        self.size = size
+        self.position = state['position'] % self.capacity
+
+    def sample(self, batch_size, device='cpu'):
+        """Sample a random minibatch as tensors (states, actions, masks, returns) on `device`."""
+        idx = np.random.randint(0, self.size, size=batch_size)
+        states = torch.from_numpy(self.states[idx]).to(device).unsqueeze(1).float()
+        actions = torch.from_numpy(self.actions[idx]).to(device)
+        masks = torch.from_numpy(self.masks[idx]).to(device)
+        returns = torch.from_numpy(self.returns[idx]).to(device)
+        return states, actions, masks, returns
+
+
+class MultiSizeReplayBuffer:
+    """One ReplayBuffer per board size, sampled into a single padded minibatch.
+
+    Samples are drawn from the sizes in proportion to the data held for each.
+    Smaller boards are padded to the largest sampled size (see conv_policy), so
+    the batch can train a size-agnostic network in one forward pass.
+    """
+
+    def __init__(self, capacity, board_sizes):
+        self.buffers = {size: ReplayBuffer(capacity, size) for size in board_sizes}
+
+    def __len__(self):
+        return sum(len(buffer) for buffer in self.buffers.values())
+
+    def add_episode(self, states, actions, masks, returns):
+        """Store one episode in the buffer of its board size."""
+        if len(actions):
+            self.buffers[len(states[0])].add_episode(states, actions, masks, returns)
+
+    def sample(self, batch_size, device='cpu'):
+        sizes = [size for size, buffer in self.buffers.items() if len(buffer)]
+        weights = np.array([len(self.buffers[size]) for size in sizes], dtype=np.float64)
+        counts = np.random.multinomial(batch_size, weights / weights.sum())
+        largest = max(size for size, count in zip(sizes, counts) if count)
+        parts = []
+        for size, count in zip(sizes, counts):
+            if count:
+                states, actions, masks, returns = self.buffers[size].sample(count, device)
+                actions, masks = pad_actions(actions, masks, size, largest)
+                parts.append((pad_boards(states, largest), actions, masks, returns))
+        return tuple(torch.cat(field) for field in zip(*parts))
+
+
+def episode_returns(num_moves, winner, gamma=1.0):
+    """Return of every move of a finished game, seen from the player who made it.
+
+    Black makes the even-numbered moves. Moves of the winner get +1 and moves of
+    the loser -1, discounted by `gamma` per move from the end; draws return 0.
+    """
+    if winner == 0:
+        return np.zeros(num_moves, dtype=np.float32)
+    movers = np.where(np.arange(num_moves) % 2 == 0, 1, 2)
+    signs = np.where(movers == winner, 1.0, -1.0)
+    discounts = gamma ** np.arange(num_moves - 1, -1, -1, dtype=np.float64)
+    return (signs * discounts).astype(np.float32)
+
+
+def policy_loss(agent, states, actions, masks, returns):
+    """Return-weighted cross entropy of the played moves over the legal moves."""
+    logits = mask_logits(agent(states), masks)
+    return (F.cross_entropy(logits, actions, reduction='none') * returns).mean()
+
+
+def update_policy(agent, optimizer, buffer, batch_size, num_updates=1, device='cpu', augment=False, telemetry=None):
+    """Run `num_updates` gradient steps on minibatches from `buffer`.
+
+    With `augment` every minibatch is built from batch_size / 8 sampled
+    positions in all 8 board symmetries, so each game is learned in every
+    orientation at the same cost per step.
+
+    Returns the summed loss as a detached tensor so callers can aggregate it
+    without forcing a device sync after every step. The forward, backward and
+    optimizer phases are timed on `telemetry` if given.
+    """
+    total_loss = torch.zeros((), device=device)
+    for _ in range(num_updates):
+        with phase(telemetry, 'forward'):
+            if augment:
+                batch = augment_batch(*buffer.sample(max(batch_size // NUM_SYMMETRIES, 1), device))
+            else:
+                batch = buffer.sample(batch_size, device)
+            loss = policy_loss(agent, *batch)
+        with phase(telemetry, 'backward'):
+            optimizer.zero_grad()
+            loss.backward()
+        with phase(telemetry, 'optimizer'):
+            optimizer.step()
+        total_loss += loss.detach()
+    return total_loss
@@ -0,0 +1,67 @@
+import queue
+import numpy as np
+import torch
+from gobang_game import GobangGame
+from gobang_policy import board_to_tensor, select_action
+from telemetry import phase
+from gobang_agent import GobangAgent
+
+
+def play_episode(game, agent, device='cpu', telemetry=None):
+    """Play one self-play game with `agent` controlling both sides.
+
+    Returns (states, actions, masks, winner) where states are the boards seen
+    before every move, actions the flat cell indices played and masks the legal
+    moves of every state. Move selection and game steps are timed as the 'act'
+    and 'env' phases of `telemetry` if given.
+    """
+    state = game.reset()
+    done = False
+    states, actions, masks = [], [], []
+    while not done and not game.is_full():
+        mask = state.reshape(-1) == 0
+        states.append(state.astype(np.int8))
+        masks.append(mask)
+        # Illegal moves are masked out, so the sampled move is always playable
+        with phase(telemetry, 'act'), torch.no_grad():
+            action_t, _ = select_action(agent, board_to_tensor(state, device),
+                                        torch.from_numpy(mask).to(device).unsqueeze(0))
+            action = action_t.item()
+        actions.append(action)
+        with phase(telemetry, 'env'):
+            state, done = game.step(divmod(action, game.board_size))
+    return states, actions, masks, game.check_winner()
+
+
+def self_play_worker(worker_id, board_size, weights_queue, trajectory_queue, stop_event, seed=0):
+    """Self-play loop run in a worker process.
+
+    The worker waits for the first set of weights, then plays games until
+    `stop_event` is set, picking up the newest weights published on
+    `weights_queue` before every game and sending finished games to
+    `trajectory_queue` as (worker_id, states, actions, masks, winner).
+    """
+    torch.set_num_threads(1)  # Workers scale across processes, not intra-op threads
+    torch.manual_seed(seed)
+    np.random.seed(seed)
+    game = GobangGame(board_size)
+    agent = GobangAgent(board_size=board_size)
+    agent.load_state_dict(weights_queue.get())
+    agent.eval()
+
+    while not stop_event.is_set():
+        try:
+            while True:  # Only the most recent weights matter
+                agent.load_state_dict(weights_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        states, actions, masks, winner = play_episode(game, agent)
+        trajectory = (worker_id, np.array(states, dtype=np.int8), np.array(actions, dtype=np.int64),
+                      np.array(masks, dtype=bool), winner)
+        while not stop_event.is_set():
+            try:
+                trajectory_queue.put(trajectory, timeout=0.5)
+                break
+            except queue.Full:
+                continue
@@ -0,0 +1,69 @@
+import numpy as np
+import torch
+from zobrist import zobrist_keys
+
+# Transform k transposes the board if k >= 4, then rotates it by (k % 4) quarter turns
+NUM_SYMMETRIES = 8
+
+
+def transform(boards, k):
+    """Apply dihedral transform `k` to the last two axes of a NumPy array or tensor."""
+    if isinstance(boards, torch.Tensor):
+        if k >= 4:
+            boards = boards.transpose(-1, -2)
+        return torch.rot90(boards, k % 4, dims=(-2, -1))
+    if k >= 4:
+        boards = np.swapaxes(boards, -1, -2)
+    return np.rot90(boards, k % 4, axes=(-2, -1))
+
+
+def inverse(k):
+    """Index of the transform that undoes transform `k` (reflections undo themselves)."""
+    return (4 - k) % 4 if k < 4 else k
+
+
+def action_maps(board_size, device='cpu'):
+    """Tensor of shape (8, n * n): entry [k, a] is where transform k moves the flat cell a."""
+    cells = torch.arange(board_size * board_size, device=device).view(board_size, board_size)
+    maps = torch.empty(NUM_SYMMETRIES, board_size * board_size, dtype=torch.long, device=device)
+    for k in range(NUM_SYMMETRIES):
+        # transform(cells, k) holds at every new position the old cell that landed there
+        maps[k, transform(cells, k).flatten()] = torch.arange(board_size * board_size, device=device)
+    return maps
+
+
+def all_symmetries(states, policies):
+    """All 8 transforms of a batch of (state, policy) pairs.
+
+    `states` has shape (B, ..., n, n) and `policies` shape (B, n * n). Returns
+    tensors with 8 * B rows, transform k of sample b in row k * B + b.
+    """
+    n = states.shape[-1]
+    grids = policies.view(-1, n, n)
+    return (torch.cat([transform(states, k) for k in range(NUM_SYMMETRIES)]),
+            torch.cat([transform(grids, k).flatten(1) for k in range(NUM_SYMMETRIES)]))
+
+
+def augment_batch(states, actions, masks, returns):
+    """Expand a training minibatch of (state, action, mask, return) to all 8 symmetries."""
+    states, masks = all_symmetries(states, masks)
+    maps = action_maps(states.shape[-1], device=actions.device)
+    actions = torch.cat([maps[k, actions] for k in range(NUM_SYMMETRIES)])
+    return states, actions, masks, returns.repeat(NUM_SYMMETRIES)
+
+
+def canonical_key(board):
+    """Zobrist hash of the canonical orientation of `board`, and the transform that produces it.
+
+    The canonical orientation is the transform with the smallest hash, so all
+    8 equivalent boards share one key. Transform 0 gives the same hash as the
+    games' incremental `hash`.
+    """
+    board = np.asarray(board)
+    n = board.shape[0]
+    keys = np.asarray(zobrist_keys(n), dtype=np.int64)
+    rows, cols = np.indices((n, n))
+    hashes = [int(np.bitwise_xor.reduce(keys[transform(board, k), rows, cols], axis=None))
+              for k in range(NUM_SYMMETRIES)]
+    k = int(np.argmin(hashes))
+    return hashes[k], k
@@ -0,0 +1,146 @@
+import csv
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+import torch
+
+# Phases of the training loop, in the column order of the CSV metrics file
+PHASES = ('env', 'act', 'forward', 'backward', 'optimizer', 'logging')
+
+
+def phase(telemetry, name):
+    """`telemetry.phase(name)`, or a no-op when training runs without telemetry."""
+    return nullcontext() if telemetry is None else telemetry.phase(name)
+
+
+class Telemetry:
+    """Per-phase timers, rolling throughput and loss aggregates for a training run.
+
+    Phase times are wall-clock seconds summed over each reporting interval:
+    'env' for game steps, 'act' for self-play forward passes, 'forward',
+    'backward' and 'optimizer' for updates, 'logging' for move logs and
+    checkpoints. Losses are summed on the device and read back once per
+    interval. Every `interval` episodes a row goes to `path` (CSV, or JSONL
+    when the name ends in .jsonl) and a one-line summary is printed.
+
+    With `profile_steps` > 0, torch.profiler records that many episodes after
+    one to wait and one to warm up, and writes a Chrome trace plus an
+    operator table to `profile_dir`.
+    """
+
+    def __init__(self, path=None, interval=50, window=100, label='', total_episodes=None,
+                 profile_steps=0, profile_dir='.', append=False, start_episode=0):
+        self.path = path
+        self.interval = interval
+        self.label = label
+        self.total_episodes = total_episodes
+        self.start_time = time.perf_counter()
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        self.recent = deque(maxlen=window)  # (end time, moves) of recent episodes
+        self.episodes = start_episode  # Counts on from the checkpoint when resuming
+        self.start_episode = start_episode
+        self.moves = 0
+        self.loss_sum = None
+        self.loss_count = 0
+        self.file = None
+        self.writer = None
+        if path is not None:
+            write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+            self.file = open(path, 'a' if append else 'w', newline='')
+            if not path.endswith('.jsonl'):
+                self.writer = csv.writer(self.file)
+                if write_header:
+                    self.writer.writerow(self.columns())
+        self.profiler = None
+        if profile_steps > 0:
+            self.profile_dir = profile_dir
+            self.profiler = torch.profiler.profile(
+                schedule=torch.profiler.schedule(wait=1, warmup=1, active=profile_steps, repeat=1),
+                on_trace_ready=self._save_profile)
+            self.profiler.start()
+
+    @staticmethod
+    def columns():
+        return (['episode', 'seconds', 'episodes_per_sec', 'moves_per_sec', 'mean_moves', 'loss']
+                + [f"{name}_s" for name in PHASES])
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] += time.perf_counter() - start
+
+    def add_loss(self, loss, count=1):
+        """Add a (summed) loss tensor without synchronizing with the device."""
+        loss = loss.detach()
+        self.loss_sum = loss if self.loss_sum is None else self.loss_sum + loss
+        self.loss_count += count
+
+    def episode_done(self, moves):
+        """Count a finished episode of `moves` moves; emits a row every `interval` episodes."""
+        self.episodes += 1
+        self.moves += moves
+        self.recent.append((time.perf_counter(), moves))
+        if self.profiler is not None:
+            self.profiler.step()
+        if self.episodes % self.interval == 0:
+            self.emit()
+
+    def throughput(self):
+        """Episodes and moves per second over the recent window of episodes."""
+        if len(self.recent) < 2:
+            elapsed = time.perf_counter() - self.start_time
+            episodes = self.episodes - self.start_episode
+            return (episodes / elapsed, self.moves / elapsed) if elapsed > 0 else (0.0, 0.0)
+        elapsed = self.recent[-1][0] - self.recent[0][0]
+        moves = sum(m for _, m in list(self.recent)[1:])
+        return (len(self.recent) - 1) / elapsed, moves / elapsed
+
+    def emit(self):
+        episodes_per_sec, moves_per_sec = self.throughput()
+        loss = self.loss_sum.item() / self.loss_count if self.loss_count else None  # One device sync per interval
+        row = {'episode': self.episodes, 'seconds': round(time.perf_counter() - self.start_time, 3),
+               'episodes_per_sec': round(episodes_per_sec, 3), 'moves_per_sec': round(moves_per_sec, 1),
+               'mean_moves': round(sum(m for _, m in self.recent) / max(len(self.recent), 1), 1),
+               'loss': None if loss is None else round(loss, 5)}
+        row.update({f"{name}_s": round(seconds, 4) for name, seconds in self.phase_times.items()})
+        if self.writer is not None:
+            self.writer.writerow([row[column] for column in self.columns()])
+        elif self.file is not None:
+            self.file.write(json.dumps(row) + '\n')
+        if self.file is not None:
+            self.file.flush()
+        total = f"/{self.total_episodes}" if self.total_episodes else ''
+        busiest = max(self.phase_times, key=self.phase_times.get)
+        print(f"{self.label}Episode {self.episodes}{total} - {episodes_per_sec:.2f} episodes/s - "
+              f"Loss: {'n/a' if loss is None else f'{loss:.4f}'} - most time in {busiest}")
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        self.loss_sum, self.loss_count = None, 0
+
+    def _save_profile(self, profiler):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profiler.export_chrome_trace(os.path.join(self.profile_dir, 'profile_trace.json'))
+        table = profiler.key_averages().table(sort_by='self_cpu_time_total', row_limit=25)
+        with open(os.path.join(self.profile_dir, 'profile.txt'), 'w') as f:
+            f.write(table)
+        print(f"Profile written to {self.profile_dir}")
+
+    def close(self):
+        if self.episodes % self.interval and self.episodes > self.start_episode:
+            self.emit()
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
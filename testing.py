@@ -1,7 +1,31 @@
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
 import unittest
+from unittest import mock
+import numpy as np
+import torch
 from gobang_agent import GobangAgent
-from gobang_game import GobangGame
-from train_gobang_rl import train_model
+from arena import elo_difference, run_arena
+from conv_policy import PAD, ConvPolicyNet, pad_boards
+from gobang_game import GobangGame, create_game
+from gobang_batched import BatchedGobangGame
+from gobang_policy import board_to_tensor, legal_move_mask, select_action
+from replay_buffer import MultiSizeReplayBuffer, ReplayBuffer, episode_returns
+from inference_server import InferenceServer
+from mcts import MCTS
+from model_cache import ModelCache, build_agent, export_model, load_inference_model, model_path
+from threat_eval import ThreatEvaluator
+from transposition import TTEntry, TranspositionTable
+from telemetry import Telemetry
+from symmetry import augment_batch, canonical_key, inverse, transform
+from zobrist import board_hash
+from game_records import GameRecordReader, TextLogReader, convert_text_log
+from train_gobang_rl import next_trajectory, pretrain_models, train_model, train_model_batched, train_multi_size
 
 class TestGobang(unittest.TestCase):
     def test_agent_initialization(self):
@@ -16,8 +40,372 @@ class TestGobang(unittest.TestCase):
         game.step((8, 8))
         self.assertEqual(game.current_player, 1)
 
+    def test_incremental_winner_matches_full_scan(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            fast = GobangGame(board_size=9)
+            reference = GobangGame(board_size=9, full_scan=True)
+            done = 0
+            while not done and not fast.is_full():
+                empty = np.argwhere(fast.board == 0)
+                x, y = empty[rng.integers(len(empty))]
+                _, done = fast.step((x, y))
+                _, reference_done = reference.step((x, y))
+                self.assertEqual(done, reference_done)
+                self.assertEqual(fast.check_winner(), reference.check_winner())
+            self.assertEqual(fast.is_full(), not np.any(fast.board == 0))
+
+    def test_bitboard_backend_matches_array(self):
+        rng = np.random.default_rng(1)
+        for _ in range(20):
+            array_game = create_game(board_size=9, backend='array')
+            bit_game = create_game(board_size=9, backend='bitboard')
+            done = 0
+            while not done and not array_game.is_full():
+                empty = np.argwhere(array_game.board == 0)
+                x, y = empty[rng.integers(len(empty))]
+                _, done = array_game.step((x, y))
+                state, bit_done = bit_game.step((x, y))
+                self.assertEqual(done, bit_done)
+            self.assertIsNone(bit_game._array)  # Playing never decoded the board
+            np.testing.assert_array_equal(array_game.board.reshape(-1), state.reshape(-1))
+            np.testing.assert_array_equal(array_game.board, bit_game.copy().board)
+            bit_game.undo()
+            array_game.undo()
+            np.testing.assert_array_equal(array_game.board, bit_game.board)
+            self.assertEqual(bit_game.check_winner(), 0)
+            self.assertEqual(bit_game.current_player, array_game.current_player)
+        for backend in ('array', 'bitboard'):
+            game = create_game(board_size=9, backend=backend, full_scan=True)  # Same options for both backends
+            game.step((4, 4))
+            self.assertEqual(game.check_winner(), 0)
+
+    def test_batched_game_detects_wins_and_resets(self):
+        env = BatchedGobangGame(num_games=3, board_size=9)
+        # Game 0 plays a horizontal five for Black, game 1 a diagonal, game 2 only fills the top row
+        black_lines = [[(4, c) for c in range(5)], [(i, i) for i in range(5)], [(0, c) for c in range(0, 9, 2)]]
+        white_lines = [[(8, c) for c in range(4)], [(8, c) for c in range(4)], [(1, c) for c in range(4)]]
+        for move in range(5):
+            _, winners, done = env.step(torch.tensor([x * 9 + y for x, y in (line[move] for line in black_lines)]))
+            if move < 4:
+                self.assertFalse(done.any())
+                env.step(torch.tensor([x * 9 + y for x, y in (line[move] for line in white_lines)]))
+        self.assertEqual(winners.tolist(), [1, 1, 0])
+        self.assertEqual(done.tolist(), [True, True, False])
+        self.assertEqual(int(env.boards[0].abs().sum()), 0)
+        self.assertEqual(int(env.legal_mask()[2].sum()), 81 - 9)
+
+    def test_masked_selection_only_picks_legal_moves(self):
+        agent = GobangAgent(board_size=9)
+        board = np.ones((9, 9), dtype=int)
+        board[3, 4] = 0
+        with torch.no_grad():
+            actions, logits = select_action(agent, board_to_tensor(board), legal_move_mask(board))
+        self.assertEqual(actions.item(), 3 * 9 + 4)
+        self.assertEqual(int(torch.isfinite(logits).sum()), 1)
+
+    def test_replay_buffer_wraps_and_samples(self):
+        buffer = ReplayBuffer(capacity=5, board_size=9)
+        states = np.zeros((3, 9, 9), dtype=int)
+        masks = np.ones((3, 81), dtype=bool)
+        buffer.add_episode(states, [0, 1, 2], masks, episode_returns(3, winner=1))
+        buffer.add_episode(states, [3, 4, 5], masks, episode_returns(3, winner=0))
+        self.assertEqual(len(buffer), 5)
+        self.assertEqual(buffer.actions.tolist(), [5, 1, 2, 3, 4])
+        self.assertEqual(buffer.returns.tolist(), [0, -1, 1, 0, 0])
+        states, actions, masks, returns = buffer.sample(4)
+        self.assertEqual(tuple(states.shape), (4, 1, 9, 9))
+        self.assertEqual(tuple(masks.shape), (4, 81))
+
+    def test_game_record_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            text_path = os.path.join(tmp, 'training_log.txt')
+            with open(text_path, 'w') as f:
+                f.write("Episode 1 - Black Move: E6\nEpisode 1 - White Move: A1\n")
+                f.write("Episode 2 - Black Move: O15\n")
+            record_path = os.path.join(tmp, 'training_log')
+            self.assertEqual(convert_text_log(text_path, record_path, board_size=15), 2)
+            reader = GameRecordReader(record_path)
+            self.assertEqual(reader.moves.dtype, np.uint8)
+            self.assertEqual(len(reader), 2)
+            self.assertEqual(reader.episode_moves(0), [('Black', 5, 4), ('White', 0, 0)])
+            self.assertEqual(reader.episode_moves(1), [('Black', 14, 14)])
+
+            text_reader = TextLogReader(text_path)
+            self.assertEqual(len(text_reader), 2)
+            self.assertEqual(text_reader.episode_moves(1), reader.episode_moves(1))
+            self.assertTrue(os.path.exists(text_path + '.index.npy'))
+            self.assertEqual(TextLogReader(text_path).episode_moves(0), reader.episode_moves(0))
+
+    def test_mcts_finds_winning_move(self):
+        game = GobangGame(board_size=9)
+        for y in range(4):
+            game.step((4, y))  # Black builds four in a row
+            game.step((0, 2 * y))
+        agent = GobangAgent(board_size=9).eval()
+        evaluated = []
+
+        def counting_agent(states):
+            evaluated.append(len(states))
+            return agent(states)
+
+        search = MCTS(counting_agent, board_size=9, num_simulations=200, batch_size=8)
+        self.assertEqual(search.best_move(game), (4, 4))
+        self.assertEqual(search.last_stats['simulations'], 200)
+        # Won leaves are scored without the network, so fewer boards are evaluated than simulations run
+        self.assertEqual(search.last_stats['evaluations'], sum(evaluated))
+        self.assertLess(search.last_stats['evaluations'], 200)
+        self.assertEqual(len(game.moves), 8)  # The searched game is left untouched
+
+        cancelled = threading.Event()
+        cancelled.set()
+        game = GobangGame(board_size=9)
+        game.step((0, 0))
+        x, y = search.best_move(game, cancel=cancelled)  # No simulation runs: falls back to the priors
+        self.assertEqual(search.last_stats['simulations'], 0)
+        self.assertTrue(game.is_valid_move(x, y))
+
+    def test_zobrist_hash_is_incremental_and_order_independent(self):
+        for backend in ('array', 'bitboard'):
+            first = create_game(board_size=9, backend=backend)
+            second = create_game(board_size=9, backend=backend)
+            for move in [(1, 1), (2, 2), (3, 3), (4, 4)]:
+                first.step(move)
+            for move in [(3, 3), (4, 4), (1, 1), (2, 2)]:
+                second.step(move)
+            self.assertEqual(first.hash, second.hash)
+            self.assertEqual(first.hash, board_hash(first.board))
+            first.undo()
+            self.assertEqual(first.hash, board_hash(first.board))
+
+    def test_transposition_table_eviction(self):
+        table = TranspositionTable(capacity=2, policy='depth', probe=2)
+        table.put(1, TTEntry(None, 0.0, depth=50))
+        table.put(2, TTEntry(None, 0.0))
+        table.put(3, TTEntry(None, 0.0))  # Evicts the shallow entry 2, not the older deep entry 1
+        self.assertIsNotNone(table.get(1))
+        self.assertIsNone(table.get(2))
+        self.assertEqual(table.stats()['evictions'], 1)
+        self.assertEqual((table.hits, table.misses), (1, 1))
+
+    def test_threat_evaluator_patterns_and_candidates(self):
+        threats = ThreatEvaluator(board_size=9)
+        for y in range(2, 5):
+            threats.place(4, y, 1)  # Open three for Black
+        threats.place(0, 0, 2)
+        self.assertEqual(threats.counts(1)['open_three'], 1)
+        self.assertEqual(threats.candidate_moves(1, limit=2), [(4, 1), (4, 5)])
+        self.assertTrue(threats.candidate_mask()[2, 2])
+        self.assertFalse(threats.candidate_mask()[8, 8])
+        threats.place(4, 5, 1)
+        self.assertEqual(threats.counts(1)['open_four'], 1)
+        self.assertEqual(threats.forced_moves(2), [(4, 1), (4, 6)])  # White has to block
+        threats.remove(4, 5)
+        self.assertEqual(threats.counts(1), {'five': 0, 'open_four': 0, 'four': 0, 'open_three': 1})
+
+    def test_symmetries_map_actions_and_share_a_canonical_key(self):
+        board = np.zeros((5, 5), dtype=np.int8)
+        board[0, 1], board[2, 3] = 1, 2
+        states = torch.from_numpy(board).float().view(1, 1, 5, 5)
+        masks = (states.flatten(1) == 0)
+        aug_states, aug_actions, aug_masks, aug_returns = augment_batch(states, torch.tensor([7]), masks,
+                                                                        torch.ones(1))
+        self.assertEqual(aug_states.shape, (8, 1, 5, 5))
+        self.assertEqual(len(aug_returns), 8)
+        keys = set()
+        for k in range(8):
+            # The played cell (1, 2) lands where transform k puts it, and stays legal there
+            self.assertTrue(aug_masks[k, aug_actions[k]])
+            self.assertEqual(transform(np.arange(25).reshape(5, 5), k).reshape(-1)[aug_actions[k]], 7)
+            self.assertTrue(np.array_equal(transform(transform(board, k), inverse(k)), board))
+            keys.add(canonical_key(transform(board, k))[0])
+        self.assertEqual(len(keys), 1)
+        game = GobangGame(5)
+        game.step((0, 1))
+        game.step((2, 3))
+        key, k = canonical_key(game.board)
+        self.assertEqual(canonical_key(transform(game.board, k))[1], 0)
+        self.assertEqual(key, board_hash(transform(game.board, k)))  # Same hashing as the games
+
+    def test_model_cache_and_quantized_export(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in (5, 6):
+                os.makedirs(os.path.join(tmp, f"{size}x{size}"))
+                torch.save(GobangAgent(board_size=size).state_dict(), model_path(size, tmp))
+            cache = ModelCache(capacity=1)
+            model = cache.get(5, model_path(5, tmp))
+            self.assertIs(cache.get(5, model_path(5, tmp)), model)  # No second read of the checkpoint
+            cache.get(6, model_path(6, tmp))
+            self.assertNotIn(5, cache)
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+            agent = build_agent(5, model_path(5, tmp)).train()
+            export_model(agent, 5, model_path(5, tmp), kind='quantized')
+            self.assertTrue(agent.training)  # Exported from a copy; the caller's model is left as it was
+            quantized = load_inference_model(5, model_path(5, tmp))
+            self.assertEqual(quantized.kind, 'quantized')
+            states = torch.rand(2, 1, 5, 5)
+            self.assertEqual(quantized(states).shape, (2, 25))
+            self.assertTrue(torch.allclose(quantized(states), model(states), atol=0.1))
+
+    def test_inference_server_batches_concurrent_requests(self):
+        agent = GobangAgent(board_size=5).eval()
+        boards = np.random.randint(0, 3, size=(8, 5, 5))
+        with InferenceServer(agent, 5, max_batch_size=8, max_latency_ms=50) as server:
+            futures = [server.submit(board) for board in boards]
+            logits = np.concatenate([future.result(timeout=5) for future in futures])
+            with self.assertRaises(ValueError):
+                server.submit(np.zeros((6, 6)))
+        with torch.no_grad():
+            expected = agent(torch.from_numpy(boards).float().unsqueeze(1)).numpy()
+        self.assertTrue(np.allclose(logits, expected, atol=1e-5))
+        stats = server.stats()
+        self.assertEqual((stats['requests'], stats['boards']), (8, 8))
+        self.assertLess(stats['batches'], 8)  # Requests within the latency window share a forward pass
+
+        def policy_value(states):
+            return agent(states), states.flatten(1).sum(1, keepdim=True)
+
+        states = torch.from_numpy(boards).float().unsqueeze(1)
+        with InferenceServer(policy_value, 5, max_batch_size=8) as server:
+            logits, values = server(states)  # The value head is passed on, as from a local agent
+        self.assertTrue(np.allclose(logits.numpy(), expected, atol=1e-5))
+        self.assertTrue(torch.equal(values, states.flatten(1).sum(1, keepdim=True)))
+
+    def test_conv_policy_is_size_agnostic(self):
+        net = ConvPolicyNet(channels=8, num_blocks=1).eval()
+        board = torch.from_numpy(np.random.randint(0, 3, size=(1, 1, 5, 5))).float()
+        with torch.no_grad():
+            alone = net(board)
+            padded = net(pad_boards(board, 7)).view(7, 7)[:5, :5].reshape(1, -1)
+        self.assertTrue(torch.allclose(alone, padded, atol=1e-5))
+
+        buffer = MultiSizeReplayBuffer(100, [5, 7])
+        buffer.add_episode(np.zeros((3, 5, 5)), [0, 6, 24], np.ones((3, 25), dtype=bool), np.ones(3))
+        buffer.add_episode(np.zeros((2, 7, 7)), [0, 48], np.ones((2, 49), dtype=bool), np.ones(2))
+        states, actions, masks, returns = buffer.sample(16)
+        self.assertEqual(states.shape, (16, 1, 7, 7))
+        self.assertTrue(masks[torch.arange(16), actions].all())  # Actions re-indexed onto the padded board
+        self.assertTrue(((states.flatten(1) == PAD) <= ~masks).all())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            train_multi_size(5, 6, episodes=4, learning_rate=0.001, save_dir=tmp, batch_size=8)
+            agent = build_agent(9, model_path(5, tmp))  # Any board size works with the same weights
+            self.assertEqual(agent(torch.zeros(1, 1, 9, 9)).shape, (1, 81))
+
+    def test_training_resumes_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            runs = {}
+            for name, stops in (('straight', [4]), ('resumed', [2, 4])):
+                torch.manual_seed(0)
+                np.random.seed(0)
+                save_dir = os.path.join(tmp, name)
+                for episodes in stops:
+                    train_model(board_size=5, episodes=episodes, learning_rate=0.001, save_dir=save_dir,
+                                batch_size=8, checkpoint_every=1, resume=True)
+                model_dir = os.path.join(save_dir, '5x5')
+                reader = GameRecordReader(os.path.join(model_dir, 'training_log'))
+                runs[name] = ([list(reader.episode(k)) for k in range(len(reader))],
+                              torch.load(os.path.join(model_dir, 'model.pth')))
+            self.assertEqual(len(runs['resumed'][0]), 4)  # Appended to the log instead of overwriting it
+            self.assertEqual(runs['straight'][0], runs['resumed'][0])
+            for name, weights in runs['straight'][1].items():
+                self.assertTrue(torch.equal(weights, runs['resumed'][1][name]))
+
+    def test_arena_match_statistics(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, '7x7'))
+            torch.save(GobangAgent(board_size=7).state_dict(), model_path(7, tmp))
+            rng_before = (random.getstate(), np.random.get_state()[1].copy(), torch.get_rng_state(),
+                          torch.get_num_threads())
+            summary = run_arena('random', 'policy:' + model_path(7, tmp), games=4, board_size=7)
+            rng_after = (random.getstate(), np.random.get_state()[1], torch.get_rng_state(), torch.get_num_threads())
+            replayed = run_arena('random', 'policy:' + model_path(7, tmp), games=4, board_size=7)
+        # Playing in this process leaves the global RNGs and thread count alone, and the seed fixes the games
+        self.assertEqual(rng_before[0], rng_after[0])
+        self.assertTrue(np.array_equal(rng_before[1], rng_after[1]))
+        self.assertTrue(torch.equal(rng_before[2], rng_after[2]))
+        self.assertEqual(rng_before[3], rng_after[3])
+        self.assertEqual(summary['moves'], replayed['moves'])
+        a, b = summary['players']['a'], summary['players']['b']
+        self.assertEqual(a['wins'] + b['wins'] + summary['draws'], 4)
+        self.assertEqual(a['moves'] + b['moves'], summary['moves'])
+        self.assertEqual(b['evaluations'], b['moves'])  # One forward pass per policy move
+        low, high = summary['score_a_ci95']
+        self.assertTrue(low <= summary['score_a'] <= high)
+        self.assertAlmostEqual(elo_difference(0.5, 10), 0.0)
+        self.assertGreater(elo_difference(0.75, 10), 0)
+
+    def test_training_telemetry_writes_metrics(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            train_model(board_size=5, episodes=3, learning_rate=0.001, save_dir=tmp, batch_size=8,
+                        metrics_every=2)
+            with open(os.path.join(tmp, '5x5', 'metrics.csv')) as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual([row['episode'] for row in rows], ['2', '3'])  # Every 2 episodes, plus the end
+            self.assertGreater(float(rows[0]['env_s']) + float(rows[0]['act_s']), 0)
+            self.assertNotEqual(rows[1]['loss'], '')
+
+            path = os.path.join(tmp, 'metrics.jsonl')
+            with Telemetry(path, interval=1) as telemetry:
+                with telemetry.phase('forward'):
+                    telemetry.add_loss(torch.tensor(2.0))
+                telemetry.episode_done(10)
+            with open(path) as f:
+                row = json.loads(f.readline())
+            self.assertEqual((row['episode'], row['loss']), (1, 2.0))
+
+    def test_batched_training_buffers_real_states(self):
+        episodes = []
+        add_episode = ReplayBuffer.add_episode
+
+        def spy(buffer, states, actions, masks, returns):
+            episodes.append([np.array(state) for state in states])
+            add_episode(buffer, states, actions, masks, returns)
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(ReplayBuffer, 'add_episode', spy):
+            train_model_batched(board_size=5, episodes=4, learning_rate=0.001, num_games=2, save_dir=tmp,
+                                batch_size=8)
+        self.assertGreaterEqual(len(episodes), 4)
+        for states in episodes:
+            # The state before move k holds exactly k stones
+            self.assertEqual([int(np.count_nonzero(state)) for state in states], list(range(len(states))))
+
+    def test_pretrain_batched_logs_and_buffers_the_same_games(self):
+        buffered = []
+        add_episode = ReplayBuffer.add_episode
+
+        def spy(buffer, states, actions, masks, returns):
+            buffered.append(([np.array(state) for state in states], list(actions), np.array(returns)))
+            add_episode(buffer, states, actions, masks, returns)
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(ReplayBuffer, 'add_episode', spy):
+            pretrain_models(5, 5, episodes=4, learning_rate=0.001, num_games=3, save_dir=tmp)
+            reader = GameRecordReader(os.path.join(tmp, '5x5', 'training_log'))
+            logged = [list(reader.episode(k)) for k in range(len(reader))]
+            self.assertTrue(os.path.exists(os.path.join(tmp, '5x5', 'model.pth')))
+        self.assertEqual(len(logged), 4)
+        for moves, (states, actions, returns) in zip(logged, buffered):
+            self.assertEqual(moves, actions)
+            game = GobangGame(5)
+            for state, action in zip(states, actions):
+                np.testing.assert_array_equal(state, game.board)  # Buffered states replay the logged game
+                game.step(divmod(action, 5))
+            self.assertTrue(game.check_winner() or game.is_full())
+            self.assertEqual(len(returns), len(actions))
+
+    def test_learner_fails_when_workers_die(self):
+        ctx = torch.multiprocessing.get_context('spawn')
+        worker = ctx.Process(target=sys.exit, args=(3,))
+        worker.start()
+        worker.join()
+        with self.assertRaisesRegex(RuntimeError, r"\(0, 3\)"):
+            next_trajectory(ctx.Queue(), [worker], poll_seconds=0.05)
+
     def test_model_training_loop(self):
-        train_model(board_size=15, episodes=1, learning_rate=0.001, save_dir="models/")
+        with tempfile.TemporaryDirectory() as tmp:
+            train_model(board_size=15, episodes=1, learning_rate=0.001, save_dir=tmp)
+            self.assertTrue(os.path.exists(os.path.join(tmp, '15x15', 'model.pth')))
 
 if __name__ == "__main__":
     unittest.main()
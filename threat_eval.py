@@ -0,0 +1,195 @@
+import numpy as np
+
+# Directions: horizontal, vertical, diagonal (both)
+DIRECTIONS = [(1, 0), (0, 1), (1, 1), (1, -1)]
+
+# Pattern columns of the per-line count arrays
+FIVE, OPEN_FOUR, FOUR, OPEN_THREE = range(4)
+PATTERNS = ('five', 'open_four', 'four', 'open_three')
+
+# Score of the longest run a move would make, by run length and number of open ends
+RUN_SCORES = {(5, 0): 100000, (5, 1): 100000, (5, 2): 100000,
+              (4, 2): 10000, (4, 1): 1000, (3, 2): 500, (3, 1): 50, (2, 2): 20, (2, 1): 5, (1, 2): 1}
+DEFENSE_WEIGHT = 0.9  # Blocking is worth slightly less than making the same threat yourself
+
+
+def line_patterns(values, player):
+    """Count fives, open fours, fours and open threes of `player` along one line.
+
+    Patterns are runs of consecutive stones; an end is open when the cell
+    next to the run is empty.
+    """
+    counts = [0, 0, 0, 0]
+    i, length = 0, len(values)
+    while i < length:
+        if values[i] != player:
+            i += 1
+            continue
+        j = i
+        while j < length and values[j] == player:
+            j += 1
+        run = j - i
+        open_ends = (i > 0 and values[i - 1] == 0) + (j < length and values[j] == 0)
+        if run >= 5:
+            counts[FIVE] += 1
+        elif run == 4 and open_ends == 2:
+            counts[OPEN_FOUR] += 1
+        elif run == 4 and open_ends == 1:
+            counts[FOUR] += 1
+        elif run == 3 and open_ends == 2:
+            counts[OPEN_THREE] += 1
+        i = j
+    return counts
+
+
+class ThreatEvaluator:
+    """Pattern-based evaluator kept up to date one stone at a time.
+
+    It tracks, per board line, how many fives, open fours, fours and open
+    threes each player has; placing or removing a stone only recounts the four
+    lines through it. It also counts the stones around every cell, which gives
+    the candidate moves (empty cells within `radius` of a stone) without
+    scanning the board.
+    """
+
+    def __init__(self, board_size=15, radius=2):
+        self.board_size = board_size
+        self.radius = radius
+        n = board_size
+        # Every line of the board as index arrays, and the line through each cell per direction
+        self.lines = []
+        self.cell_lines = np.zeros((4, n, n), dtype=np.int32)
+        for d, (dx, dy) in enumerate(DIRECTIONS):
+            for x in range(n):
+                for y in range(n):
+                    if 0 <= x - dx < n and 0 <= y - dy < n:
+                        continue  # Not the first cell of its line
+                    cells = []
+                    cx, cy = x, y
+                    while 0 <= cx < n and 0 <= cy < n:
+                        cells.append((cx, cy))
+                        self.cell_lines[d, cx, cy] = len(self.lines)
+                        cx, cy = cx + dx, cy + dy
+                    self.lines.append((np.array([c[0] for c in cells]), np.array([c[1] for c in cells])))
+        self.reset()
+
+    def reset(self):
+        n = self.board_size
+        self.board = np.zeros((n, n), dtype=np.int8)
+        self.near = np.zeros((n, n), dtype=np.int16)  # Stones within `radius` of every cell
+        self.line_counts = np.zeros((len(self.lines), 3, 4), dtype=np.int32)  # [line][player][pattern]
+        self.line_stones = np.zeros((len(self.lines), 3), dtype=np.int32)  # [line][player]
+        self.totals = np.zeros((3, 4), dtype=np.int32)  # [player][pattern]
+        self.stones = 0
+
+    @classmethod
+    def from_board(cls, board, radius=2):
+        evaluator = cls(len(board), radius)
+        evaluator.sync(board)
+        return evaluator
+
+    def sync(self, board):
+        """Rebuild the state from a full board, e.g. after the game was reset."""
+        self.reset()
+        board = np.asarray(board)
+        for x, y in zip(*np.nonzero(board)):
+            self.place(int(x), int(y), int(board[x, y]))
+
+    def copy(self):
+        evaluator = ThreatEvaluator.__new__(ThreatEvaluator)
+        evaluator.__dict__.update(self.__dict__)
+        for name in ('board', 'near', 'line_counts', 'line_stones', 'totals'):
+            setattr(evaluator, name, getattr(self, name).copy())
+        return evaluator
+
+    def place(self, x, y, player):
+        """Add a stone of `player` at (x, y)."""
+        self.board[x, y] = player
+        self.stones += 1
+        self._update_near(x, y, 1)
+        self._recount(x, y)
+
+    def remove(self, x, y):
+        """Take the stone at (x, y) off the board."""
+        self.board[x, y] = 0
+        self.stones -= 1
+        self._update_near(x, y, -1)
+        self._recount(x, y)
+
+    def _update_near(self, x, y, delta):
+        r = self.radius
+        self.near[max(x - r, 0):x + r + 1, max(y - r, 0):y + r + 1] += delta
+
+    def _recount(self, x, y):
+        for d in range(4):
+            line = self.cell_lines[d, x, y]
+            values = self.board[self.lines[line]].tolist()
+            self.totals -= self.line_counts[line]
+            for player in (1, 2):
+                self.line_counts[line, player] = line_patterns(values, player)
+                self.line_stones[line, player] = values.count(player)
+            self.totals += self.line_counts[line]
+
+    def counts(self, player):
+        """Number of fives, open fours, fours and open threes of `player` on the board."""
+        return dict(zip(PATTERNS, self.totals[player].tolist()))
+
+    def candidate_mask(self):
+        """Boolean (board_size, board_size) mask of the candidate moves."""
+        if self.stones == 0:
+            mask = np.zeros_like(self.board, dtype=bool)
+            mask[self.board_size // 2, self.board_size // 2] = True  # Open in the center
+            return mask
+        return (self.near > 0) & (self.board == 0)
+
+    def run_through(self, x, y, dx, dy, player):
+        """Length and open ends of the run `player` would have through (x, y) along (dx, dy)."""
+        n, board = self.board_size, self.board
+        run, open_ends = 1, 0
+        for sx, sy in ((dx, dy), (-dx, -dy)):
+            cx, cy = x + sx, y + sy
+            while 0 <= cx < n and 0 <= cy < n and board[cx, cy] == player:
+                run += 1
+                cx, cy = cx + sx, cy + sy
+            open_ends += 0 <= cx < n and 0 <= cy < n and board[cx, cy] == 0
+        return run, open_ends
+
+    def move_score(self, x, y, player):
+        """Threat score of the empty cell (x, y) for `player`: own threats plus blocked ones."""
+        score = 0.0
+        for owner, weight in ((player, 1.0), (3 - player, DEFENSE_WEIGHT)):
+            for dx, dy in DIRECTIONS:
+                run, open_ends = self.run_through(x, y, dx, dy, owner)
+                score += weight * RUN_SCORES.get((min(run, 5), open_ends), 0)
+        return score
+
+    def winning_moves(self, player):
+        """Empty cells where `player` completes five in a row.
+
+        Only lines holding at least four stones of `player` can have one: a
+        cell wins when some five-cell window through it holds four stones of
+        `player` and no other empty cell.
+        """
+        wins = set()
+        for line in np.flatnonzero(self.line_stones[:, player] >= 4):
+            xs, ys = self.lines[line]
+            values = self.board[xs, ys].tolist()
+            for start in range(len(values) - 4):
+                window = values[start:start + 5]
+                if window.count(player) == 4 and window.count(0) == 1:
+                    k = start + window.index(0)
+                    wins.add((int(xs[k]), int(ys[k])))
+        return sorted(wins)
+
+    def forced_moves(self, player):
+        """Moves `player` must consider first: immediate wins, else blocks of the opponent's wins.
+
+        Returns an empty list when there is neither.
+        """
+        return self.winning_moves(player) or self.winning_moves(3 - player)
+
+    def candidate_moves(self, player, limit=None):
+        """Candidate cells ordered by threat score for `player`, best first."""
+        xs, ys = np.nonzero(self.candidate_mask())
+        moves = sorted(zip(xs.tolist(), ys.tolist()), key=lambda move: -self.move_score(move[0], move[1], player))
+        return moves if limit is None else moves[:limit]
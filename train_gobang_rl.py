@@ -1,20 +1,45 @@
 import torch
 import torch.optim as optim
-import torch.nn as nn
-import numpy as np
+import torch.multiprocessing as mp
 import os
+import argparse
+import queue
+from contextlib import ExitStack
 from gobang_game import GobangGame  # Game environment class
+from gobang_batched import BatchedGobangGame  # Vectorized environment for batched self-play
+from gobang_policy import select_action
+from self_play import play_episode, self_play_worker
+from game_records import TrainingLog
+from replay_buffer import MultiSizeReplayBuffer, ReplayBuffer, episode_returns, update_policy
+from conv_policy import ConvPolicyNet, load_checkpoint, save_checkpoint
+from telemetry import Telemetry, phase
+from checkpoint import CHECKPOINT_FILE, atomic_save, load_training_checkpoint, save_training_checkpoint
 from gobang_agent import GobangAgent  # Neural network agent class
 
 # Set device to GPU if available, otherwise CPU
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 print(f"Using device: {device}")
 
-def train_model(board_size, episodes, learning_rate, save_dir='models/'):
-    """Train a Gobang agent for a given board size with logging."""
+def train_model(board_size, episodes, learning_rate, save_dir='models/', batch_size=256,
+                update_every=1, updates_per_round=1, buffer_size=50000, text_log=False, augment=True,
+                checkpoint_every=100, resume=False, metrics_file='metrics.csv', metrics_every=50, profile_steps=0):
+    """Train a Gobang agent for a given board size with logging.
+
+    Self-play moves go into a replay buffer; every `update_every` episodes the
+    agent takes `updates_per_round` gradient steps on minibatches of `batch_size`,
+    built from all 8 board symmetries of the sampled positions if `augment` is set.
+    Games are logged to a binary game record, plus the old text log if `text_log` is set.
+
+    Every `checkpoint_every` episodes the full training state is saved to
+    checkpoint.pth in the model directory. With `resume` training continues
+    from that checkpoint, if there is one, and appends to the logs.
+
+    Phase timings, throughput and the mean loss are written to `metrics_file`
+    in the model directory every `metrics_every` episodes (see Telemetry);
+    `profile_steps` > 0 also profiles that many episodes with torch.profiler.
+    """
     game = GobangGame(board_size)
     agent = GobangAgent(board_size=board_size).to(device)  # Move model to GPU/CPU
-    print("Agent parameters:", list(agent.parameters()))  # Check if model parameters exist
 
     # Ensure model is in training mode
     agent.train()
@@ -24,61 +49,113 @@ def train_model(board_size, episodes, learning_rate, save_dir='models/'):
         raise ValueError("Model has no parameters")
 
     optimizer = optim.Adam(agent.parameters(), lr=learning_rate)  # Initialize optimizer with agent's parameters
-    loss_fn = nn.CrossEntropyLoss()
+    buffer = ReplayBuffer(buffer_size, board_size)
 
     # Create a subdirectory for this board size
     model_dir = os.path.join(save_dir, f"{board_size}x{board_size}")
     os.makedirs(model_dir, exist_ok=True)
 
     # Log file path
-    log_file = os.path.join(model_dir, 'training_log.txt')
+    log_file = os.path.join(model_dir, 'training_log')
+
+    checkpoint_path = os.path.join(model_dir, CHECKPOINT_FILE)
+    start_episode, log_offsets = 0, None
+    if resume and os.path.exists(checkpoint_path):
+        start_episode, log_offsets = load_training_checkpoint(checkpoint_path, agent, optimizer, buffer)
+        print(f"Resuming {board_size}x{board_size} training at episode {start_episode + 1}")
 
-    # Open the log file to save steps
+    # Open the log to save moves (appending to it when resuming)
     try:
-        with open(log_file, 'w') as f:
-            for episode in range(episodes):
-                state = game.reset()
-                done = False
-                total_loss = 0
-                print(f"Episode {episode + 1}/{episodes} for {board_size}x{board_size} board...")
+        with TrainingLog(model_dir, board_size, text_log, resume_at=log_offsets) as move_log, \
+                Telemetry(os.path.join(model_dir, metrics_file) if metrics_file else None, metrics_every,
+                          label=f"Board Size {board_size} - ", total_episodes=episodes,
+                          profile_steps=profile_steps, profile_dir=model_dir,
+                          append=log_offsets is not None, start_episode=start_episode) as telemetry:
+            for episode in range(start_episode, episodes):
+                states, actions, masks, winner = play_episode(game, agent, device, telemetry)
 
-                current_player = 1  # Start with Black player
+                with phase(telemetry, 'logging'):
+                    move_log.write_episode(actions)
 
-                while not done:
-                    state_tensor = torch.FloatTensor(np.array(state)).unsqueeze(0).unsqueeze(0).to(device)
-                    action_logits = agent(state_tensor)
-                    action_probs = torch.softmax(action_logits, dim=-1)
-                    action_dist = torch.distributions.Categorical(action_probs)
-                    action = action_dist.sample().item()
-                    x, y = divmod(action, board_size)
+                buffer.add_episode(states, actions, masks, episode_returns(len(actions), winner))
+                if (episode + 1) % update_every == 0 and len(buffer) >= batch_size:
+                    telemetry.add_loss(update_policy(agent, optimizer, buffer, batch_size, updates_per_round,
+                                                     device, augment, telemetry), updates_per_round)
 
-                    if not game.is_valid_move(x, y):
-                        continue  # Skip invalid moves
+                if (episode + 1) % checkpoint_every == 0 or episode + 1 == episodes:
+                    with phase(telemetry, 'logging'):
+                        save_training_checkpoint(checkpoint_path, agent, optimizer, episode + 1, move_log, buffer)
+                telemetry.episode_done(len(actions))
 
-                    new_state, done = game.step((x, y))
-                    reward = 1 if done else 0
+            # Save the model for this board size
+            model_path = os.path.join(model_dir, "model.pth")
+            atomic_save(agent.state_dict(), model_path)
+            print(f"Model for {board_size}x{board_size} board saved at {model_path}")
 
-                    # Log the move to the file with the episode and current player
-                    player = 'Black' if current_player == 1 else 'White'
-                    f.write(f"Episode {episode + 1} - {player} Move: {chr(y + 65)}{x + 1}\n")
-                    f.flush()  # Ensure that the content is written immediately
+    except Exception as e:
+        print(f"Error writing to file {log_file}: {e}")
 
-                    # Alternate players
-                    current_player = 2 if current_player == 1 else 1
 
-                    # Compute loss
-                    target = torch.tensor([action], dtype=torch.long).to(device)
-                    loss = loss_fn(action_logits, target)
-                    total_loss += loss.item()
+def train_model_batched(board_size, episodes, learning_rate, num_games=64, save_dir='models/',
+                        batch_size=256, update_every=None, updates_per_round=1, buffer_size=50000,
+                        text_log=False, augment=True, metrics_file='metrics.csv', metrics_every=50,
+                        profile_steps=0):
+    """Train a Gobang agent on many self-play games at once, one forward pass per ply.
 
-                    optimizer.zero_grad()
-                    loss.backward()
-                    optimizer.step()
-                    state = new_state
+    Finished games go into a replay buffer, and the agent is updated after every
+    `update_every` finished games (default: `num_games`). Metrics are reported
+    as in train_model.
+    """
+    env = BatchedGobangGame(num_games, board_size, device=device)
+    agent = GobangAgent(board_size=board_size).to(device)
+    agent.train()
 
-                print(f"Board Size {board_size} - Episode {episode + 1}/{episodes} - Loss: {total_loss:.4f}")
+    optimizer = optim.Adam(agent.parameters(), lr=learning_rate)
+    buffer = ReplayBuffer(buffer_size, board_size)
+    update_every = update_every or num_games
+
+    model_dir = os.path.join(save_dir, f"{board_size}x{board_size}")
+    os.makedirs(model_dir, exist_ok=True)
+    log_file = os.path.join(model_dir, 'training_log')
+
+    try:
+        with TrainingLog(model_dir, board_size, text_log) as move_log, \
+                Telemetry(os.path.join(model_dir, metrics_file) if metrics_file else None, metrics_every,
+                          label=f"Board Size {board_size} - ", total_episodes=episodes,
+                          profile_steps=profile_steps, profile_dir=model_dir) as telemetry:
+            env.reset()
+            # States, moves and masks of the game running in each slot
+            game_states = [[] for _ in range(num_games)]
+            game_moves = [[] for _ in range(num_games)]
+            game_masks = [[] for _ in range(num_games)]
+            finished = 0
+            while finished < episodes:
+                with phase(telemetry, 'act'), torch.no_grad():
+                    # Copy: on the CPU .numpy() is a view of the boards that env.step() and reset_games() overwrite
+                    boards, masks = env.boards.cpu().numpy().copy(), env.legal_mask()
+                    actions, _ = select_action(agent, env.observations(), masks)
+                    masks = masks.cpu().numpy()
+
+                with phase(telemetry, 'env'):
+                    _, winners, done = env.step(actions)
+                for i, action in enumerate(actions.tolist()):
+                    game_states[i].append(boards[i])
+                    game_moves[i].append(action)
+                    game_masks[i].append(masks[i])
+                for i in torch.nonzero(done).flatten().tolist():
+                    winner = int(winners[i])
+                    buffer.add_episode(game_states[i], game_moves[i], game_masks[i],
+                                       episode_returns(len(game_moves[i]), winner))
+                    if finished < episodes:
+                        finished += 1
+                        with phase(telemetry, 'logging'):
+                            move_log.write_episode(game_moves[i])
+                        if finished % update_every == 0 and len(buffer) >= batch_size:
+                            telemetry.add_loss(update_policy(agent, optimizer, buffer, batch_size, updates_per_round,
+                                                             device, augment, telemetry), updates_per_round)
+                        telemetry.episode_done(len(game_moves[i]))
+                    game_states[i], game_moves[i], game_masks[i] = [], [], []
 
-            # Save the model for this board size
             model_path = os.path.join(model_dir, "model.pth")
             torch.save(agent.state_dict(), model_path)
             print(f"Model for {board_size}x{board_size} board saved at {model_path}")
@@ -87,13 +164,208 @@ def train_model(board_size, episodes, learning_rate, save_dir='models/'):
         print(f"Error writing to file {log_file}: {e}")
 
 
+def next_trajectory(trajectory_queue, workers, poll_seconds=1.0):
+    """Wait for the next finished game from the self-play workers.
+
+    Raises RuntimeError if a worker has exited, since workers only stop when
+    the learner tells them to; without this the learner would wait forever.
+    """
+    while True:
+        try:
+            return trajectory_queue.get(timeout=poll_seconds)
+        except queue.Empty:
+            dead = [(i, worker.exitcode) for i, worker in enumerate(workers) if not worker.is_alive()]
+            if dead:
+                raise RuntimeError(f"Self-play workers died (worker, exit code): {dead}")
+
+
+def train_parallel(board_size, episodes, learning_rate, num_workers=4, sync_interval=10, save_dir='models/',
+                   batch_size=256, update_every=1, updates_per_round=1, buffer_size=50000, text_log=False,
+                   augment=True, metrics_file='metrics.csv', metrics_every=50, profile_steps=0):
+    """Train with `num_workers` self-play processes feeding this process as the learner.
+
+    Workers play with a copy of the agent that is refreshed every `sync_interval`
+    learner episodes and stream finished games back over a queue. Metrics are
+    reported as in train_model; the learner's time waiting for games counts as 'env'.
+    """
+    agent = GobangAgent(board_size=board_size).to(device)
+    agent.train()
+    optimizer = optim.Adam(agent.parameters(), lr=learning_rate)
+    buffer = ReplayBuffer(buffer_size, board_size)
+
+    model_dir = os.path.join(save_dir, f"{board_size}x{board_size}")
+    os.makedirs(model_dir, exist_ok=True)
+    log_file = os.path.join(model_dir, 'training_log')
+
+    ctx = mp.get_context('spawn')
+    weights_queues = [ctx.Queue() for _ in range(num_workers)]
+    trajectory_queue = ctx.Queue(maxsize=4 * num_workers)
+    stop_event = ctx.Event()
+
+    def publish_weights():
+        weights = {name: tensor.detach().cpu() for name, tensor in agent.state_dict().items()}
+        for weights_queue in weights_queues:
+            weights_queue.put(weights)
+
+    workers = [ctx.Process(target=self_play_worker,
+                           args=(i, board_size, weights_queues[i], trajectory_queue, stop_event, i + 1),
+                           daemon=True)
+               for i in range(num_workers)]
+    for worker in workers:
+        worker.start()
+    publish_weights()
+
+    try:
+        with TrainingLog(model_dir, board_size, text_log) as move_log, \
+                Telemetry(os.path.join(model_dir, metrics_file) if metrics_file else None, metrics_every,
+                          label=f"Board Size {board_size} ({num_workers} workers) - ", total_episodes=episodes,
+                          profile_steps=profile_steps, profile_dir=model_dir) as telemetry:
+            for episode in range(episodes):
+                with phase(telemetry, 'env'):
+                    _, states, actions, masks, winner = next_trajectory(trajectory_queue, workers)
+                buffer.add_episode(states, actions, masks, episode_returns(len(actions), winner))
+                with phase(telemetry, 'logging'):
+                    move_log.write_episode(actions)
+
+                if (episode + 1) % update_every == 0 and len(buffer) >= batch_size:
+                    telemetry.add_loss(update_policy(agent, optimizer, buffer, batch_size, updates_per_round,
+                                                     device, augment, telemetry), updates_per_round)
+                if (episode + 1) % sync_interval == 0:
+                    publish_weights()
+                telemetry.episode_done(len(actions))
+
+            model_path = os.path.join(model_dir, "model.pth")
+            torch.save(agent.state_dict(), model_path)
+            print(f"Model for {board_size}x{board_size} board saved at {model_path}")
+
+    except RuntimeError:
+        raise  # Dead workers: fail loudly instead of reporting a file error
+
+    except Exception as e:
+        print(f"Error writing to file {log_file}: {e}")
+
+    finally:
+        stop_event.set()
+        for worker in workers:
+            while worker.is_alive():
+                try:  # Unblock workers waiting to hand over a finished game
+                    trajectory_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            worker.join()
+
+
+def train_multi_size(min_size, max_size, episodes, learning_rate, save_dir='models/', batch_size=256,
+                     update_every=1, updates_per_round=1, buffer_size=50000, text_log=False, augment=True,
+                     init_from=None, channels=64, num_blocks=4, metrics_file='metrics.csv', metrics_every=50,
+                     profile_steps=0):
+    """Train one size-agnostic agent on every board size from min_size to max_size.
+
+    The agent is a fully convolutional ConvPolicyNet, so the same weights play
+    on any board. Self-play cycles through the sizes (`episodes` is the total
+    over all of them) and every update trains on a minibatch mixing all sizes.
+    `init_from` warm-starts from a saved ConvPolicyNet checkpoint of any board
+    size, e.g. to fine-tune onto a new size. The result is saved as the
+    model.pth of every size. Metrics are reported as in train_model, to
+    `metrics_file` in `save_dir`.
+    """
+    sizes = list(range(min_size, max_size + 1))
+    if init_from is not None:
+        agent = load_checkpoint(init_from, device)
+        print(f"Warm-starting from {init_from}")
+    else:
+        agent = ConvPolicyNet(channels, num_blocks).to(device)
+    agent.train()
+    optimizer = optim.Adam(agent.parameters(), lr=learning_rate)
+    buffer = MultiSizeReplayBuffer(buffer_size, sizes)
+    games = {size: GobangGame(size) for size in sizes}
+    model_dirs = {size: os.path.join(save_dir, f"{size}x{size}") for size in sizes}
+
+    try:
+        with ExitStack() as stack:
+            move_logs = {}
+            for size in sizes:
+                os.makedirs(model_dirs[size], exist_ok=True)
+                move_logs[size] = stack.enter_context(TrainingLog(model_dirs[size], size, text_log))
+            telemetry = stack.enter_context(
+                Telemetry(os.path.join(save_dir, metrics_file) if metrics_file else None, metrics_every,
+                          label=f"Board Sizes {min_size}-{max_size} - ", total_episodes=episodes,
+                          profile_steps=profile_steps, profile_dir=save_dir))
+
+            for episode in range(episodes):
+                size = sizes[episode % len(sizes)]
+                states, actions, masks, winner = play_episode(games[size], agent, device, telemetry)
+                with phase(telemetry, 'logging'):
+                    move_logs[size].write_episode(actions)
+                buffer.add_episode(states, actions, masks, episode_returns(len(actions), winner))
+                if (episode + 1) % update_every == 0 and len(buffer) >= batch_size:
+                    telemetry.add_loss(update_policy(agent, optimizer, buffer, batch_size, updates_per_round,
+                                                     device, augment, telemetry), updates_per_round)
+                telemetry.episode_done(len(actions))
+
+            for size in sizes:
+                model_path = os.path.join(model_dirs[size], "model.pth")
+                save_checkpoint(agent, model_path)
+                print(f"Model for {size}x{size} board saved at {model_path}")
+
+    except Exception as e:
+        print(f"Error writing to {save_dir}: {e}")
+
+
 # Function to pretrain models for different board sizes
-def pretrain_models(min_size, max_size, episodes, learning_rate):
-    """Pretrain Gobang models for board sizes from min_size to max_size."""
+def pretrain_models(min_size, max_size, episodes, learning_rate, num_workers=0, sync_interval=10, augment=True,
+                    multi_size=False, init_from=None, resume=False, metrics_every=50, profile_steps=0,
+                    num_games=0, save_dir='models/'):
+    """Pretrain Gobang models for board sizes from min_size to max_size.
+
+    With `multi_size` a single size-agnostic agent is trained on all sizes at
+    once, for `episodes` episodes in total. With `num_games` > 0 each size
+    plays that many self-play games at once, one forward pass per ply (see
+    train_model_batched). With `resume` single-process training continues
+    from each size's last checkpoint.
+    """
+    common_args = {'save_dir': save_dir, 'augment': augment, 'metrics_every': metrics_every,
+                   'profile_steps': profile_steps}
+    if multi_size:
+        train_multi_size(min_size, max_size, episodes, learning_rate, init_from=init_from, **common_args)
+        return
     for size in range(min_size, max_size + 1):
         print(f"Training model for {size}x{size} board...")
-        train_model(size, episodes, learning_rate)
+        if num_workers > 0:
+            train_parallel(size, episodes, learning_rate, num_workers, sync_interval, **common_args)
+        elif num_games > 0:
+            train_model_batched(size, episodes, learning_rate, num_games, **common_args)
+        else:
+            train_model(size, episodes, learning_rate, resume=resume, **common_args)
 
 if __name__ == "__main__":
-    # Train only 15x15 board and log moves to 'training_log.txt'
-    pretrain_models(min_size=15, max_size=15, episodes=1000, learning_rate=0.002)
+    parser = argparse.ArgumentParser(description="Train Gobang agents by self-play.")
+    parser.add_argument("--min-size", type=int, default=15)
+    parser.add_argument("--max-size", type=int, default=15)
+    parser.add_argument("--episodes", type=int, default=1000)
+    parser.add_argument("--lr", type=float, default=0.002)
+    parser.add_argument("--workers", type=int, default=0, help="Self-play worker processes (0 = single process)")
+    parser.add_argument("--sync-interval", type=int, default=10, help="Episodes between worker weight syncs")
+    parser.add_argument("--no-augment", action="store_true", help="Train on sampled positions in one orientation only")
+    parser.add_argument("--multi-size", action="store_true",
+                        help="Train one fully convolutional agent on all sizes at once")
+    parser.add_argument("--init-from", help="Multi-size checkpoint to warm-start or fine-tune from")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the last checkpoint of each size and append to its log")
+    parser.add_argument("--metrics-every", type=int, default=50,
+                        help="Episodes between rows of models/NxN/metrics.csv")
+    parser.add_argument("--profile-steps", type=int, default=0,
+                        help="Profile this many episodes with torch.profiler (0 = off)")
+    parser.add_argument("--batched", action="store_true",
+                        help="Play --num-games self-play games at once with one forward pass per ply")
+    parser.add_argument("--num-games", type=int, default=64, help="Games played at once with --batched")
+    args = parser.parse_args()
+    if args.resume and (args.workers > 0 or args.multi_size or args.batched):
+        parser.error("--resume is only supported for single-process training of each size")
+    if args.batched and (args.workers > 0 or args.multi_size):
+        parser.error("--batched cannot be combined with --workers or --multi-size")
+
+    # By default, train only the 15x15 board and log moves to 'training_log.txt'
+    pretrain_models(args.min_size, args.max_size, args.episodes, args.lr, args.workers, args.sync_interval,
+                    not args.no_augment, args.multi_size, args.init_from, args.resume,
+                    args.metrics_every, args.profile_steps, args.num_games if args.batched else 0)
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+
+class TTEntry:
+    """Cached results for one position: network outputs and, once searched, the search value."""
+
+    __slots__ = ('priors', 'value', 'search_value', 'depth')
+
+    def __init__(self, priors, value, search_value=None, depth=0):
+        self.priors = priors  # Network policy over all cells, in the orientation the key was computed for
+        self.value = value  # Network value for the player to move
+        self.search_value = search_value  # Search value for the player to move, if the position was searched
+        self.depth = depth  # Simulations behind search_value (0 for a bare network evaluation)
+
+
+class TranspositionTable:
+    """Bounded position cache keyed by Zobrist hash.
+
+    With policy='lru' the least recently used entry is evicted when the table
+    is full. With policy='depth' the shallowest of the `probe` least recently
+    used entries is evicted instead, so deeply searched positions outlive
+    bare network evaluations. Hits, misses and evictions are counted for
+    sizing the table.
+    """
+
+    def __init__(self, capacity=50000, policy='lru', probe=8):
+        if policy not in ('lru', 'depth'):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        self.probe = probe
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """Return the entry for `key`, or None; a hit marks the entry as recently used."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        """Store `entry` under `key`, evicting another entry if the table is full."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        elif len(self.entries) >= self.capacity:
+            self._evict()
+        self.entries[key] = entry
+
+    def _evict(self):
+        if self.policy == 'lru':
+            self.entries.popitem(last=False)
+        else:
+            oldest = []
+            for key, entry in self.entries.items():
+                oldest.append((entry.depth, len(oldest), key))
+                if len(oldest) == self.probe:
+                    break
+            del self.entries[min(oldest)[2]]
+        self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': len(self.entries), 'capacity': self.capacity, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,27 @@
+from functools import lru_cache
+import numpy as np
+
+ZOBRIST_SEED = 20240917  # Fixed so hashes are stable across runs and processes
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(board_size):
+    """Random 64-bit key per (player, x, y), as nested lists of Python ints.
+
+    keys[player][x][y] for player 1 and 2; keys[0] is all zeros so that an
+    empty cell contributes nothing.
+    """
+    rng = np.random.default_rng(ZOBRIST_SEED + board_size)
+    keys = rng.integers(1, 2 ** 63, size=(3, board_size, board_size), dtype=np.int64)
+    keys[0] = 0
+    return keys.tolist()
+
+
+def board_hash(board):
+    """Zobrist hash of a whole board; games keep the same value up to date move by move."""
+    board = np.asarray(board)
+    keys = zobrist_keys(board.shape[0])
+    h = 0
+    for x, y in zip(*np.nonzero(board)):
+        h ^= keys[board[x, y]][x][y]
+    return h